@@ -35,6 +35,12 @@ async def get_current_user(
     return user
 
 
+async def get_current_superuser(user: User = Depends(get_current_user)) -> User:
+    if not user.is_superuser:
+        raise RequestError(err_msg="Admin access only!", status_code=403)
+    return user
+
+
 async def get_client(
     token: Optional[HTTPAuthorizationCredentials] = Depends(jwt_scheme),
     guest_id: Optional[str] = Depends(guest_scheme),
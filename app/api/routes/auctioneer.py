@@ -15,18 +15,23 @@ from app.api.schemas.auctioneer import (
     UpdateProfileResponseSchema,
     ProfileResponseSchema,
 )
+from app.api.utils.serializers import fast_response, serialize_bid, serialize_listing
 from app.common.exception_handlers import RequestError
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.db.managers.listings import (
     category_manager,
     listing_manager,
     bid_manager,
 )
 from app.db.managers.accounts import user_manager
-from app.db.managers.base import file_manager
+from app.db.managers.base import file_manager, unit_of_work
 from app.db.models.accounts import User
+from app.common.responses import NegotiatedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=NegotiatedRoute)
+
+# Read by the listing responses, filled after writes
+LISTING_RELATIONSHIPS = ["auctioneer", "category", "image"]
 
 
 @router.get(
@@ -52,18 +57,19 @@ async def update_profile(
 ) -> UpdateProfileResponseSchema:
     file_type = data.file_type
     data = data.dict()
-    if file_type:
-        file = user.avatar
-        # Create file object
-        if file:
-            file = await file_manager.update(
-                db, user.avatar, {"resource_type": file_type}
-            )
-        else:
-            file = await file_manager.create(db, {"resource_type": file_type})
-        data.update({"avatar_id": file.id})
-    data.pop("file_type", None)
-    user = await user_manager.update(db, user, data)
+    async with unit_of_work(db):
+        if file_type:
+            file = user.avatar
+            # Create file object
+            if file:
+                file = await file_manager.update(
+                    db, user.avatar, {"resource_type": file_type}
+                )
+            else:
+                file = await file_manager.create(db, {"resource_type": file_type})
+            data.update({"avatar_id": file.id})
+        data.pop("file_type", None)
+        user = await user_manager.update(db, user, data, load=["avatar"])
     return {"message": "User updated!", "data": user}
 
 
@@ -75,14 +81,17 @@ async def update_profile(
 async def retrieve_listings(
     user: User = Depends(get_current_user),
     quantity: int = None,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ) -> ListingsResponseSchema:
     listings = await listing_manager.get_by_auctioneer_id(db, user.id)
 
     if quantity:
         # Retrieve based on amount
         listings = listings[:quantity]
-    return {"message": "Auctioneer Listings fetched", "data": listings}
+    return fast_response(
+        "Auctioneer Listings fetched",
+        [serialize_listing(listing) for listing in listings],
+    )
 
 
 @router.post(
@@ -119,12 +128,13 @@ async def create_listing(
     )
     data.pop("category", None)
 
-    # Create file object
-    file = await file_manager.create(db, {"resource_type": data["file_type"]})
-    data.update({"image_id": file.id})
-    data.pop("file_type")
+    async with unit_of_work(db):
+        # Create file object
+        file = await file_manager.create(db, {"resource_type": data["file_type"]})
+        data.update({"image_id": file.id})
+        data.pop("file_type")
 
-    listing = await listing_manager.create(db, data)
+        listing = await listing_manager.create(db, data, load=LISTING_RELATIONSHIPS)
     return {"message": "Listing created successfully", "data": listing}
 
 
@@ -168,14 +178,17 @@ async def update_listing(
         data.update({"category_id": category.id if category else None})
         data.pop("category", None)
 
-    file_type = data.get("file_type")
-    if file_type:
-        file = await file_manager.update(
-            db, listing.image, {"resource_type": file_type}
+    async with unit_of_work(db):
+        file_type = data.get("file_type")
+        if file_type:
+            file = await file_manager.update(
+                db, listing.image, {"resource_type": file_type}
+            )
+            data.update({"image_id": file.id})
+        data.pop("file_type", None)
+        listing = await listing_manager.update(
+            db, listing, data, load=LISTING_RELATIONSHIPS
         )
-        data.update({"image_id": file.id})
-    data.pop("file_type", None)
-    listing = await listing_manager.update(db, listing, data)
     return {"message": "Listing updated successfully", "data": listing}
 
 
@@ -187,7 +200,7 @@ async def update_listing(
 async def retrieve_bids(
     slug: str,
     user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ) -> BidsResponseSchema:
     # Get listing by slug
     listing = await listing_manager.get_by_slug(db, slug)
@@ -198,8 +211,8 @@ async def retrieve_bids(
     if user.id != listing.auctioneer_id:
         raise RequestError(err_msg="This listing doesn't belong to you!")
 
-    bids = await bid_manager.get_by_listing_id(db, listing.id)
-    return {
-        "message": "Listing Bids fetched",
-        "data": {"listing": listing.name, "bids": bids},
-    }
+    bids = await bid_manager.get_by_listing_id(db, listing.pkid)
+    return fast_response(
+        "Listing Bids fetched",
+        {"listing": listing.name, "bids": [serialize_bid(bid) for bid in bids]},
+    )
@@ -16,7 +16,7 @@ from app.api.schemas.auth import (
 from app.common.exception_handlers import RequestError
 from app.api.schemas.base import ResponseSchema
 from app.core.database import get_db
-from app.db.managers.base import guestuser_manager
+from app.db.managers.base import guestuser_manager, unit_of_work
 
 from app.db.models.accounts import User
 from app.db.managers.accounts import user_manager, otp_manager, jwt_manager
@@ -26,8 +26,9 @@ from app.api.utils.emails import send_email
 from app.core.security import verify_password
 from app.api.utils.auth import Authentication
 from app.db.models.base import GuestUser
+from app.common.responses import ORJSONRoute
 
-router = APIRouter()
+router = APIRouter(route_class=ORJSONRoute)
 
 
 @router.post(
@@ -50,11 +51,12 @@ async def register(
             data={"email": "Email already registered!"},
         )
 
-    # Create user
-    user = await user_manager.create(db, data.dict())
+    async with unit_of_work(db):
+        # Create user
+        user = await user_manager.create(db, data.dict())
 
-    # Send verification email
-    await send_email(background_tasks, db, user, "activate")
+        # Send verification email
+        await send_email(background_tasks, db, user, "activate")
 
     return {"message": "Registration successful", "data": {"email": user.email}}
 
@@ -84,8 +86,9 @@ async def verify_email(
     if otp.check_expiration():
         raise RequestError(err_msg="Expired Otp")
 
-    user = await user_manager.update(db, user_by_email, {"is_email_verified": True})
-    await otp_manager.delete(db, otp)
+    async with unit_of_work(db):
+        user = await user_manager.update(db, user_by_email, {"is_email_verified": True})
+        await otp_manager.delete(db, otp)
     # Send welcome email
     await send_email(background_tasks, db, user, "welcome")
     return {"message": "Account verification successful"}
@@ -184,29 +187,30 @@ async def login(
 
     if not user.is_email_verified:
         raise RequestError(err_msg="Verify your email first", status_code=401)
-    await jwt_manager.delete_by_user_id(db, user.id)
+    async with unit_of_work(db):
+        await jwt_manager.delete_by_user_id(db, user.id)
+
+        # Create tokens and store in jwt model
+        access = await Authentication.create_access_token({"user_id": str(user.id)})
+        refresh = await Authentication.create_refresh_token()
+        await jwt_manager.create(
+            db, {"user_id": user.id, "access": access, "refresh": refresh}
+        )
 
-    # Create tokens and store in jwt model
-    access = await Authentication.create_access_token({"user_id": str(user.id)})
-    refresh = await Authentication.create_refresh_token()
-    await jwt_manager.create(
-        db, {"user_id": user.id, "access": access, "refresh": refresh}
-    )
-
-    # Move all guest user watchlists to the authenticated user watchlists
-    guest_user_watchlists = await watchlist_manager.get_by_session_key(
-        db, client.id if client else None, user.id
-    )
-    if len(guest_user_watchlists) > 0:
-        data_to_create = [
-            {"user_id": user.id, "listing_id": listing_id}.copy()
-            for listing_id in guest_user_watchlists
-        ]
-        await watchlist_manager.bulk_create(db, data_to_create)
-
-    if isinstance(client, GuestUser):
-        # Delete client (Almost like clearing sessions)
-        await guestuser_manager.delete(db, client)
+        # Move all guest user watchlists to the authenticated user watchlists
+        guest_user_watchlists = await watchlist_manager.get_by_session_key(
+            db, client.pkid if isinstance(client, GuestUser) else None, user.pkid
+        )
+        if len(guest_user_watchlists) > 0:
+            data_to_create = [
+                {"user_id": user.pkid, "listing_id": listing_id}.copy()
+                for listing_id in guest_user_watchlists
+            ]
+            await watchlist_manager.bulk_create(db, data_to_create)
+
+        if isinstance(client, GuestUser):
+            # Delete client (Almost like clearing sessions)
+            await guestuser_manager.delete(db, client)
 
     return {
         "message": "Login successful",
@@ -1,20 +1,39 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, BackgroundTasks, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.api.schemas.general import (
+    SiteDetailDataSchema,
     SubscriberSchema,
     SiteDetailResponseSchema,
     SubscriberResponseSchema,
     ReviewsResponseSchema,
 )
-from app.core.database import get_db
+from app.api.utils.serializers import fast_response, serialize_review
+from app.common.cache import StaleWhileRevalidateCache
+from app.common.shared_cache import shared_cache
+from app.core.config import settings
+from app.core.database import get_db, get_read_db
 
 from app.db.managers.general import (
     sitedetail_manager,
     subscriber_manager,
     review_manager,
 )
+from app.common.responses import NegotiatedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=NegotiatedRoute)
+
+sitedetail_cache = StaleWhileRevalidateCache(
+    "sitedetail",
+    ttl=settings.SITE_DETAIL_CACHE_TTL,
+    max_stale=settings.SITE_DETAIL_CACHE_MAX_STALE,
+    tables=("sitedetails",),
+    shared=shared_cache,
+)
+
+
+async def load_sitedetail(db: AsyncSession) -> dict:
+    sitedetail = await sitedetail_manager.get(db)
+    return SiteDetailDataSchema.from_orm(sitedetail).dict()
 
 
 @router.get(
@@ -23,9 +42,12 @@ router = APIRouter()
     description="This endpoint retrieves few details of the site/application",
 )
 async def retrieve_site_details(
-    db: AsyncSession = Depends(get_db),
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_read_db),
 ) -> SiteDetailResponseSchema:
-    sitedetail = await sitedetail_manager.get(db)
+    sitedetail = await sitedetail_cache.get(
+        db, "detail", load_sitedetail, background_tasks
+    )
     return {"message": "Site Details fetched", "data": sitedetail}
 
 
@@ -51,6 +73,8 @@ async def subscribe(
     summary="Retrieve site reviews",
     description="This endpoint retrieves a few reviews of the application",
 )
-async def reviews(db: AsyncSession = Depends(get_db)) -> ReviewsResponseSchema:
+async def reviews(db: AsyncSession = Depends(get_read_db)) -> ReviewsResponseSchema:
     reviews = await review_manager.get_active(db)
-    return {"message": "Reviews fetched", "data": reviews}
+    return fast_response(
+        "Reviews fetched", [serialize_review(review) for review in reviews]
+    )
@@ -1,5 +1,4 @@
-from fastapi import APIRouter, Depends
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, BackgroundTasks, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.api.dependencies import get_client, get_current_user
 
@@ -8,13 +7,18 @@ from app.api.schemas.listings import (
     ListingsResponseSchema,
     ListingResponseSchema,
     CategoriesResponseSchema,
+    CategoryDataSchema,
     CreateBidSchema,
     BidsResponseSchema,
     BidResponseSchema,
     AddOrRemoveWatchlistResponseSchema,
 )
-from app.core.database import get_db
-from app.db.managers.base import guestuser_manager
+from app.api.utils.serializers import fast_response, serialize_bid, serialize_listing
+from app.common.cache import StaleWhileRevalidateCache
+from app.common.shared_cache import shared_cache
+from app.core.config import settings
+from app.core.database import get_db, get_read_db
+from app.db.managers.base import guestuser_manager, unit_of_work
 from app.db.managers.listings import (
     listing_manager,
     bid_manager,
@@ -26,8 +30,37 @@ from app.db.models.accounts import User
 from typing import Optional, Union
 
 from app.db.models.base import GuestUser
+from app.db.models.listings import ListingArchive
+from app.common.responses import APIResponse, NegotiatedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=NegotiatedRoute)
+
+# Tables the listing feeds are built from (listing, its auctioneer, category and image)
+LISTING_FEED_TABLES = ("listings", "users", "categories", "files")
+listings_cache = StaleWhileRevalidateCache(
+    "listings",
+    ttl=settings.LISTINGS_CACHE_TTL,
+    max_stale=settings.LISTINGS_CACHE_MAX_STALE,
+    tables=LISTING_FEED_TABLES,
+)
+category_listings_cache = StaleWhileRevalidateCache(
+    "category_listings",
+    ttl=settings.CATEGORY_LISTINGS_CACHE_TTL,
+    max_stale=settings.CATEGORY_LISTINGS_CACHE_MAX_STALE,
+    tables=LISTING_FEED_TABLES,
+)
+categories_cache = StaleWhileRevalidateCache(
+    "categories",
+    ttl=settings.CATEGORIES_CACHE_TTL,
+    max_stale=settings.CATEGORIES_CACHE_MAX_STALE,
+    tables=("categories",),
+    shared=shared_cache,
+)
+
+
+async def load_categories(db: AsyncSession) -> list:
+    categories = await category_manager.get_all(db)
+    return [CategoryDataSchema.from_orm(category).dict() for category in categories]
 
 
 @router.get(
@@ -36,29 +69,24 @@ router = APIRouter()
     description="This endpoint retrieves all listings",
 )
 async def retrieve_listings(
+    background_tasks: BackgroundTasks,
     quantity: int = None,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     client: Optional[Union["User", "GuestUser"]] = Depends(get_client),
 ) -> ListingsResponseSchema:
-
-    listings = await listing_manager.get_all(db)
+    listings = await listings_cache.get(
+        db, "all", listing_manager.get_all, background_tasks
+    )
     if quantity:
         # Retrieve based on amount
         listings = listings[:quantity]
 
+    watchlist_ids = await watchlist_manager.get_listing_ids_by_client(db, client)
     data = [
-        {
-            "watchlist": True
-            if await watchlist_manager.get_by_client_id_and_listing_id(
-                db, client.id if client else None, listing.id
-            )
-            else False,
-            "time_left_seconds": listing.time_left_seconds,
-            **listing.dict(),
-        }
+        serialize_listing(listing, listing.pkid in watchlist_ids)
         for listing in listings
     ]
-    return {"message": "Listings fetched", "data": data}
+    return fast_response("Listings fetched", data)
 
 
 @router.get(
@@ -67,22 +95,28 @@ async def retrieve_listings(
     description="This endpoint retrieves detail of a listing",
 )
 async def retrieve_listing_detail(
-    slug: str, db: AsyncSession = Depends(get_db)
+    slug: str, db: AsyncSession = Depends(get_read_db)
 ) -> ListingResponseSchema:
-    listing = await listing_manager.get_by_slug(db, slug)
+    # Old links to closed listings resolve from the archive
+    listing = await listing_manager.get_coalesced(db, "get_by_slug", slug, True)
     if not listing:
         raise RequestError(err_msg="Listing does not exist!", status_code=404)
 
     related_listings = (
-        await listing_manager.get_related_listings(db, listing.category_id, slug)
+        await listing_manager.get_coalesced(
+            db, "get_related_listings", listing.category_id, slug
+        )
     )[:3]
-    return {
-        "message": "Listing details fetched",
-        "data": {
-            "listing": listing,
-            "related_listings": related_listings,
+    return fast_response(
+        "Listing details fetched",
+        {
+            "listing": serialize_listing(listing),
+            "related_listings": [
+                serialize_listing(related_listing)
+                for related_listing in related_listings
+            ],
         },
-    }
+    )
 
 
 @router.get(
@@ -91,21 +125,12 @@ async def retrieve_listing_detail(
     description="This endpoint retrieves all listings",
 )
 async def retrieve_watchlist(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     client: Optional[Union["User", "GuestUser"]] = Depends(get_client),
 ) -> ListingsResponseSchema:
-    watchlists = await watchlist_manager.get_by_client_id(
-        db, client.id if client else None
-    )
-    data = [
-        {
-            "watchlist": True,
-            "time_left_seconds": watchlist.listing.time_left_seconds,
-            **watchlist.listing.dict(),
-        }
-        for watchlist in watchlists
-    ]
-    return {"message": "Watchlist Listings fetched", "data": data}
+    watchlists = await watchlist_manager.get_by_client(db, client)
+    data = [serialize_listing(watchlist.listing, True) for watchlist in watchlists]
+    return fast_response("Watchlist Listings fetched", data)
 
 
 @router.post(
@@ -122,35 +147,36 @@ async def add_or_remove_watchlist_listings(
     db: AsyncSession = Depends(get_db),
     client: Optional[Union["User", "GuestUser"]] = Depends(get_client),
 ) -> AddOrRemoveWatchlistResponseSchema:
-    if not client:
-        client = await guestuser_manager.create(db, {})
+    async with unit_of_work(db):
+        if not client:
+            client = await guestuser_manager.create(db, {})
 
-    listing = await listing_manager.get_by_slug(db, data.slug)
-    if not listing:
-        raise RequestError(err_msg="Listing does not exist!", status_code=404)
+        listing = await listing_manager.get_by_slug(db, data.slug)
+        if not listing:
+            raise RequestError(err_msg="Listing does not exist!", status_code=404)
 
-    data_entry = {"session_key": client.id, "listing_id": listing.id}
-    if isinstance(client, User):
-        # Here we know its a real user and not a session user.
-        del data_entry["session_key"]
-        data_entry["user_id"] = client.id
+        data_entry = {"session_key": client.pkid, "listing_id": listing.pkid}
+        if isinstance(client, User):
+            # Here we know its a real user and not a session user.
+            del data_entry["session_key"]
+            data_entry["user_id"] = client.pkid
 
-    watchlist = await watchlist_manager.get_by_client_id_and_listing_id(
-        db, client.id, listing.id
-    )
-    # If watchlist exists, then its a removal action
-    resp_message = "Listing removed from user watchlist"
-    status_code = 200
-    if not watchlist:
-        # If watchlist doesn't exist, then its a addition action
-        await watchlist_manager.create(db, data_entry)
-        resp_message = "Listing added to user watchlist"
-        status_code = 201
-    else:
-        await watchlist_manager.delete(db, watchlist)
+        watchlist = await watchlist_manager.get_by_client_and_listing_id(
+            db, client, listing.pkid
+        )
+        # If watchlist exists, then its a removal action
+        resp_message = "Listing removed from user watchlist"
+        status_code = 200
+        if not watchlist:
+            # If watchlist doesn't exist, then its a addition action
+            await watchlist_manager.create(db, data_entry)
+            resp_message = "Listing added to user watchlist"
+            status_code = 201
+        else:
+            await watchlist_manager.delete(db, watchlist)
 
     guestuser_id = client.id if isinstance(client, GuestUser) else None
-    return JSONResponse(
+    return APIResponse(
         {
             "status": "success",
             "message": resp_message,
@@ -166,9 +192,12 @@ async def add_or_remove_watchlist_listings(
     description="This endpoint retrieves all categories",
 )
 async def retrieve_categories(
-    db: AsyncSession = Depends(get_db),
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_read_db),
 ) -> CategoriesResponseSchema:
-    categories = await category_manager.get_all(db)
+    categories = await categories_cache.get(
+        db, "all", load_categories, background_tasks
+    )
     return {"message": "Categories fetched", "data": categories}
 
 
@@ -179,7 +208,8 @@ async def retrieve_categories(
 )
 async def retrieve_category_listings(
     slug: str,
-    db: AsyncSession = Depends(get_db),
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_read_db),
     client: Optional[Union["User", "GuestUser"]] = Depends(get_client),
 ) -> ListingsResponseSchema:
     # listings with category 'other' have category column as null
@@ -189,20 +219,18 @@ async def retrieve_category_listings(
         if not category:
             raise RequestError(err_msg="Invalid category", status_code=404)
 
-    listings = await listing_manager.get_by_category(db, category)
+    listings = await category_listings_cache.get(
+        db,
+        slug,
+        lambda own_db: listing_manager.get_by_category(own_db, category),
+        background_tasks,
+    )
+    watchlist_ids = await watchlist_manager.get_listing_ids_by_client(db, client)
     data = [
-        {
-            "watchlist": True
-            if await watchlist_manager.get_by_client_id_and_listing_id(
-                db, client.id if client else None, listing.id
-            )
-            else False,
-            "time_left_seconds": listing.time_left_seconds,
-            **listing.dict(),
-        }
+        serialize_listing(listing, listing.pkid in watchlist_ids)
         for listing in listings
     ]
-    return {"message": "Category Listings fetched", "data": data}
+    return fast_response("Category Listings fetched", data)
 
 
 @router.get(
@@ -211,20 +239,22 @@ async def retrieve_category_listings(
     description="This endpoint retrieves at most 3 bids from a particular listing.",
 )
 async def retrieve_listing_bids(
-    slug: str, db: AsyncSession = Depends(get_db)
+    slug: str, db: AsyncSession = Depends(get_read_db)
 ) -> BidsResponseSchema:
-    listing = await listing_manager.get_by_slug(db, slug)
+    listing = await listing_manager.get_coalesced(db, "get_by_slug", slug, True)
     if not listing:
         raise RequestError(err_msg="Listing does not exist!", status_code=404)
 
-    bids = (await bid_manager.get_by_listing_id(db, listing.id))[:3]
-    return {
-        "message": "Listing Bids fetched",
-        "data": {
-            "listing": listing.name,
-            "bids": bids,
-        },
-    }
+    archived = isinstance(listing, ListingArchive)
+    bids = (
+        await bid_manager.get_coalesced(
+            db, "get_by_listing_id", listing.pkid, archived
+        )
+    )[:3]
+    return fast_response(
+        "Listing Bids fetched",
+        {"listing": listing.name, "bids": [serialize_bid(bid) for bid in bids]},
+    )
 
 
 @router.post(
@@ -258,19 +288,23 @@ async def create_bid(
     elif amount <= listing.highest_bid:
         raise RequestError(err_msg="Bid amount must be more than the highest bid!")
 
-    bid = await bid_manager.get_by_user_and_listing_id(db, user.id, listing.id)
-    if bid:
-        # Update existing bid
-        bid = await bid_manager.update(db, bid, {"amount": amount})
-    else:
-        # Create new bid
-        bids_count += 1
-        bid = await bid_manager.create(
-            db,
-            {"user_id": user.id, "listing_id": listing.id, "amount": amount},
+    async with unit_of_work(db):
+        bid = await bid_manager.get_by_user_and_listing_id(
+            db, user.pkid, listing.pkid
         )
+        if bid:
+            # Update existing bid
+            bid = await bid_manager.update(db, bid, {"amount": amount}, load=["user"])
+        else:
+            # Create new bid
+            bids_count += 1
+            bid = await bid_manager.create(
+                db,
+                {"user_id": user.pkid, "listing_id": listing.pkid, "amount": amount},
+                load=["user"],
+            )
 
-    await listing_manager.update(
-        db, listing, {"highest_bid": amount, "bids_count": bids_count}
-    )
+        await listing_manager.update(
+            db, listing, {"highest_bid": amount, "bids_count": bids_count}
+        )
     return {"message": "Bid added to listing", "data": bid}
@@ -1,15 +1,18 @@
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
 from app.main import app
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.api.utils.auth import Authentication
 from app.core.database import Base
+from app.common.cache import invalidate_tables
 from app.db.managers.accounts import jwt_manager, user_manager
 from app.db.managers.listings import category_manager, listing_manager
 from app.db.managers.base import file_manager
 from pytest_postgresql import factories
 from pytest_postgresql.janitor import DatabaseJanitor
 from httpx import AsyncClient
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 import pytest, asyncio
 
@@ -46,6 +49,8 @@ async def database(engine):
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
+    # Tables were recreated behind the managers' back
+    invalidate_tables()
 
     TestSessionLocal = async_sessionmaker(
         bind=engine,
@@ -55,6 +60,31 @@ async def database(engine):
         yield db
 
 
+@pytest.fixture
+def record_statements(database):
+    """
+    `with record_statements() as statements:` records the (statement, parameters) sent
+    to the database within the block, cache invalidation notifications left out
+    """
+
+    @contextmanager
+    def record():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, *args):
+            if "pg_notify" not in statement:
+                statements.append((statement, parameters))
+
+        sync_engine = database.bind.sync_engine
+        event.listen(sync_engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(sync_engine, "before_cursor_execute", before_cursor_execute)
+
+    return record
+
+
 @pytest.fixture
 async def client(database):
     async def overide_get_db():
@@ -64,6 +94,7 @@ async def client(database):
             await database.close()
 
     app.dependency_overrides[get_db] = overide_get_db
+    app.dependency_overrides[get_read_db] = overide_get_db
     async with AsyncClient(app=app, base_url="http://test/api/v6") as client:
         yield client
 
@@ -139,5 +170,7 @@ async def create_listing(verified_user, database):
         "closing_date": datetime.now() + timedelta(days=1),
         "image_id": file.id,
     }
-    listing = await listing_manager.create(database, listing_dict)
+    listing = await listing_manager.create(
+        database, listing_dict, load=["auctioneer", "category", "image"]
+    )
     return {"user": verified_user, "listing": listing, "category": category}
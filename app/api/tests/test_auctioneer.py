@@ -172,8 +172,8 @@ async def test_auctioneer_listings_bids(
     await bid_manager.create(
         database,
         {
-            "user_id": another_verified_user.id,
-            "listing_id": listing.id,
+            "user_id": another_verified_user.pkid,
+            "listing_id": listing.pkid,
             "amount": 5000.00,
         },
     )
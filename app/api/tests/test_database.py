@@ -0,0 +1,139 @@
+from app.core.config import settings
+from app.core.database import (
+    CancelOnDisconnectMiddleware,
+    MeteredPool,
+    get_read_db,
+    make_session_maker,
+    pool_options,
+)
+from app.db.managers.accounts import user_manager
+from app.db.managers.listings import listing_manager
+from fastapi import Request
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+import asyncio, pytest, time
+
+
+async def test_pool_metrics(authorized_client, verified_user, database):
+    engine = create_async_engine(
+        database.bind.url,
+        poolclass=MeteredPool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.1,
+    )
+    async with engine.connect():
+        # Verify that a starved pool shows up in the gauges
+        with pytest.raises(exc.TimeoutError):
+            async with engine.connect():
+                pass
+        stats = engine.pool.stats
+        assert stats["checked_out"] == 1
+        assert stats["timeouts"] == 1
+        assert stats["max_wait_ms"] >= 100
+    assert engine.pool.stats["checked_in"] == 1
+    await engine.dispose()
+
+    await user_manager.update(database, verified_user, {"is_superuser": True})
+    response = await authorized_client.get("/metrics")
+    assert "checked_out" in response.json()["database_pools"]["interactive"]
+
+
+async def test_named_pool_statement_timeout(database):
+    engine = create_async_engine(
+        database.bind.url, **pool_options("test", 1, 0, statement_timeout=100)
+    )
+    async with engine.connect() as conn:
+        assert (await conn.execute(text("SHOW statement_timeout"))).scalar() == "100ms"
+        assert (
+            await conn.execute(text("SELECT current_setting('application_name')"))
+        ).scalar().endswith(":test")
+
+        # Verify that the pool's timeout cancels long statements
+        with pytest.raises(exc.OperationalError):
+            await conn.execute(text("SELECT pg_sleep(1)"))
+    await engine.dispose()
+
+
+async def test_read_statement_timeout(database, monkeypatch):
+    engine = create_async_engine(database.bind.url, **pool_options("test", 1, 0, 0))
+    monkeypatch.setattr(
+        "app.core.database.SessionLocal", make_session_maker(engine, 0, pooler=False)
+    )
+    request = Request({"type": "http", "headers": []})
+    sessions = get_read_db(request)
+    db = await anext(sessions)
+
+    # Verify that reads on the primary run under the tighter read timeout
+    timeout = (await db.execute(text("SHOW statement_timeout"))).scalar()
+    assert timeout == f"{settings.READ_STATEMENT_TIMEOUT // 1000}s"
+    await sessions.aclose()
+    await engine.dispose()
+
+
+async def test_cancel_on_disconnect(database):
+    engine = create_async_engine(database.bind.url, **pool_options("test", 1, 0, 0))
+
+    async def slow_read(scope, receive, send):
+        async with async_sessionmaker(engine)() as db:
+            await db.execute(text("SELECT pg_sleep(5)"))
+
+    messages = [{"type": "http.request"}, {"type": "http.disconnect"}]
+
+    async def receive():
+        if len(messages) == 1:
+            await asyncio.sleep(0.2)
+        return messages.pop(0)
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    await CancelOnDisconnectMiddleware(slow_read)(
+        {"type": "http", "method": "GET"}, receive, send
+    )
+
+    # Verify that the query was abandoned and its connection given back
+    assert time.perf_counter() - start < 2
+    assert engine.pool.checkedout() == 0
+    await engine.dispose()
+
+
+async def test_background_tasks_after_response():
+    finished = []
+
+    async def read_with_background_task(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+        await asyncio.sleep(0.3)
+        finished.append(True)
+
+    messages = [{"type": "http.request"}, {"type": "http.disconnect"}]
+
+    async def receive():
+        if len(messages) == 1:
+            await asyncio.sleep(0.1)
+        return messages.pop(0)
+
+    async def send(message):
+        pass
+
+    # Verify that the disconnect reported once responded doesn't cut the task off
+    await CancelOnDisconnectMiddleware(read_with_background_task)(
+        {"type": "http", "method": "GET"}, receive, send
+    )
+    assert finished == [True]
+
+
+async def test_prepared_hot_queries(database):
+    engine = create_async_engine(database.bind.url, **pool_options("test", 1, 0, 0))
+    async with async_sessionmaker(engine)() as db:
+        for _ in range(3):
+            await listing_manager.get_by_slug(db, "slug")
+
+        # Verify that the repeated manager query got prepared on the connection
+        prepared = (
+            await db.execute(text("SELECT statement FROM pg_prepared_statements"))
+        ).scalars()
+        assert any("FROM listings" in statement for statement in prepared)
+    await engine.dispose()
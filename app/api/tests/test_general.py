@@ -1,4 +1,11 @@
-from app.db.managers.general import review_manager
+from app.db.managers.accounts import user_manager
+from app.db.managers.general import review_manager, sitedetail_manager
+from app.api.routes.general import sitedetail_cache
+from app.common.shared_cache import SharedMemoryTier
+from app.common.warmup import warm_up
+from app.main import app
+from sqlalchemy.ext.asyncio import async_sessionmaker
+import fcntl
 
 BASE_URL_PATH = "/general"
 
@@ -14,6 +21,47 @@ async def test_retrieve_sitedetail(client):
     assert all(item in json_resp["data"] for item in keys)
 
 
+async def test_sitedetail_shared_cache(client, database, tmp_path, mocker):
+    # Two tiers on the same file stand in for two workers on one host
+    path = str(tmp_path / "cache")
+    worker_tier = SharedMemoryTier(path, slots=8, slot_size=4096)
+    other_worker_tier = SharedMemoryTier(path, slots=8, slot_size=4096)
+    mocker.patch.object(sitedetail_cache, "shared", worker_tier)
+
+    response = await client.get(f"{BASE_URL_PATH}/site-detail")
+    assert response.status_code == 200
+    value, _ = other_worker_tier.get("sitedetail", "detail")
+    assert value == response.json()["data"]
+    # Verify that reads don't lock
+    flock = mocker.spy(fcntl, "flock")
+    assert other_worker_tier.get("sitedetail", "detail")[0] == value
+    assert flock.call_count == 0
+
+    # Verify that a write evicts the host level entry too
+    sitedetail = await sitedetail_manager.get(database)
+    await sitedetail_manager.update(database, sitedetail, {"name": "New Name"})
+    assert other_worker_tier.get("sitedetail", "detail") is None
+    response = await client.get(f"{BASE_URL_PATH}/site-detail")
+    assert response.json()["data"]["name"] == "New Name"
+    assert other_worker_tier.stats["host_stores"] == 2
+
+    # Verify that a stale marked entry keeps its value, only its age moves
+    other_worker_tier.expire("sitedetail", None, 0)
+    assert worker_tier.get("sitedetail", "detail") == (response.json()["data"], 0)
+
+
+async def test_warm_up(database):
+    session_maker = async_sessionmaker(database.bind, expire_on_commit=False)
+    await warm_up(app, database.bind, session_maker)
+
+    # Verify that the first request is served from the warmed cache
+    hits = sitedetail_cache.hits
+    assert sitedetail_cache.stats["entries"] == 1
+    assert database.bind.pool.checkedin() > 0
+    await sitedetail_cache.get(database, "detail", None, None)
+    assert sitedetail_cache.hits == hits + 1
+
+
 async def test_subscribe(client):
     # Check response validity
     response = await client.post(
@@ -43,3 +91,14 @@ async def test_retrieve_reviews(client, verified_user, database, mocker):
         "message": "Reviews fetched",
         "data": [{"reviewer": mocker.ANY, "text": "This is a nice new platform"}],
     }
+
+
+async def test_metrics(authorized_client, verified_user, database):
+    # Verify that the metrics are for admins only
+    response = await authorized_client.get("/metrics")
+    assert response.status_code == 403
+
+    await user_manager.update(database, verified_user, {"is_superuser": True})
+    response = await authorized_client.get("/metrics")
+    assert response.status_code == 200
+    assert "singleflight" in response.json()
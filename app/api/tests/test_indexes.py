@@ -0,0 +1,104 @@
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from pytest_postgresql.janitor import DatabaseJanitor
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.db.managers.accounts import jwt_manager, otp_manager, user_manager
+from app.db.managers.base import guestuser_manager
+from app.db.managers.general import review_manager, subscriber_manager
+from app.db.managers.listings import (
+    bid_event_manager,
+    bid_manager,
+    category_manager,
+    listing_manager,
+    watchlist_manager,
+)
+from app.db.models.accounts import User
+from app.db.models.base import GuestUser
+import asyncio, uuid
+
+ID = uuid.uuid4()
+PKID = 1
+
+
+async def run_manager_queries(db):
+    await user_manager.get_by_email(db, "test@example.com")
+    await user_manager.get_by_id(db, ID)
+    await otp_manager.get_by_user_id(db, ID)
+    await jwt_manager.get_by_user_id(db, ID)
+    await jwt_manager.get_by_refresh(db, "refresh")
+    await guestuser_manager.get_by_id(db, ID)
+    await subscriber_manager.get_by_email(db, "test@example.com")
+    await review_manager.get_active(db)
+    await review_manager.get_count(db)
+    await category_manager.get_by_name(db, "name")
+    await category_manager.get_by_slug(db, "slug")
+    await listing_manager.get_all(db)
+    await listing_manager.get_by_auctioneer_id(db, ID)
+    await listing_manager.get_by_slug(db, "slug")
+    await listing_manager.get_related_listings(db, ID, "slug")
+    await listing_manager.get_by_category(db, None)
+    await watchlist_manager.get_by_user_id(db, PKID)
+    await watchlist_manager.get_by_session_key(db, PKID, PKID)
+    for client in (User(pkid=PKID), GuestUser(pkid=PKID)):
+        await watchlist_manager.get_by_client(db, client)
+        await watchlist_manager.get_by_client_and_listing_id(db, client, PKID)
+        await watchlist_manager.get_listing_ids_by_client(db, client)
+    await bid_manager.get_by_user_id(db, PKID)
+    await bid_manager.get_by_listing_id(db, PKID)
+    await bid_manager.get_by_user_and_listing_id(db, PKID, PKID)
+    await bid_event_manager.get_by_listing_id(db, PKID)
+
+
+async def test_manager_queries_use_indexes(database, record_statements):
+    # Record every statement the hot manager queries send
+    with record_statements() as statements:
+        await run_manager_queries(database)
+    assert len(statements) == 28
+
+    # Verify that each of them can be planned without a sequential scan
+    # (tables are empty, so seq scans are disabled to make the planner show index use)
+    async with database.bind.connect() as conn:
+        await conn.exec_driver_sql("SET enable_seqscan = off")
+        for statement, parameters in statements:
+            plan = (
+                await conn.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+            ).scalars()
+            plan = "\n".join(plan)
+            assert "Seq Scan" not in plan, f"{statement}\n{plan}"
+            assert "Index" in plan, f"{statement}\n{plan}"
+
+
+async def test_migrations(test_db):
+    # A database of its own, the other tests' tables come from create_all
+    name = "test_migrations"
+    url = (
+        f"postgresql+psycopg://{test_db.user}:@{test_db.host}:{test_db.port}/{name}"
+    )
+    config = Config("alembic.ini")
+    config.attributes["url"] = url
+    with DatabaseJanitor(
+        test_db.user,
+        test_db.host,
+        test_db.port,
+        name,
+        test_db.version,
+        test_db.password,
+    ):
+        # env.py runs its own event loop
+        await asyncio.to_thread(command.upgrade, config, "head")
+
+        engine = create_async_engine(url)
+        async with engine.connect() as conn:
+            version = (
+                await conn.execute(text("SELECT version_num FROM alembic_version"))
+            ).scalar()
+            indexes = await conn.run_sync(
+                lambda sync: inspect(sync).get_indexes("listings")
+            )
+        await engine.dispose()
+
+    # Verify that every migration applied, the concurrent index builds included
+    assert version == ScriptDirectory.from_config(config).get_current_head()
+    assert "ix_listings_created_at" in {index["name"] for index in indexes}
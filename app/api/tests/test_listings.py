@@ -1,6 +1,29 @@
 from app.db.managers.accounts import jwt_manager
-from app.db.managers.listings import category_manager, watchlist_manager, bid_manager
+from app.db.managers.listings import (
+    category_manager,
+    listing_manager,
+    watchlist_manager,
+    bid_manager,
+    bid_event_manager,
+)
 from app.api.utils.auth import Authentication
+from app.db.managers.base import unit_of_work
+from app.common.singleflight import single_flight
+from app.api.routes.listings import listings_cache
+from app.common.cache import (
+    CACHE_INVALIDATION_CHANNEL,
+    CacheInvalidationListener,
+)
+from app.api.schemas.listings import ListingDataSchema, BidDataSchema
+from app.api.utils.serializers import serialize_bid, serialize_listing
+from app.core.database import PRIMARY_PIN_COOKIE, get_read_db
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import func, inspect, select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import asyncio, json, msgpack, pytest
 
 BASE_URL_PATH = "/listings"
 
@@ -17,6 +40,30 @@ async def test_retrieve_all_listings(client, create_listing):
     assert any(isinstance(obj["name"], str) for obj in data)
 
 
+async def test_retrieve_all_listings_msgpack(client, create_listing):
+    # Verify that msgpack clients get the same payload
+    json_response = await client.get(BASE_URL_PATH)
+    response = await client.get(
+        BASE_URL_PATH, headers={"Accept": "application/msgpack"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(response.content) == json_response.json()
+
+    # Verify that the acceptable type with the highest quality wins, json on ties
+    for accept, content_type in [
+        ("application/msgpack;q=0", "application/json"),
+        ("application/msgpack; q=0.0, application/json", "application/json"),
+        ("application/msgpack;q=0.5, application/json", "application/json"),
+        ("application/json, application/msgpack;q=0.1", "application/json"),
+        ("application/json;q=0.1, application/msgpack;q=0.9", "application/msgpack"),
+        ("application/msgpack, */*", "application/json"),
+        ("application/msgpack, */*;q=0.8", "application/msgpack"),
+    ]:
+        response = await client.get(BASE_URL_PATH, headers={"Accept": accept})
+        assert response.headers["content-type"] == content_type
+
+
 async def test_retrieve_particular_listng(mocker, client, create_listing):
     listing = create_listing["listing"]
 
@@ -55,11 +102,143 @@ async def test_retrieve_particular_listng(mocker, client, create_listing):
     }
 
 
+async def test_fast_path_serializers(create_listing, another_verified_user, database):
+    listing = create_listing["listing"]
+    bid = await bid_manager.create(
+        database,
+        {
+            "user_id": another_verified_user.pkid,
+            "listing_id": listing.pkid,
+            "amount": 5000,
+        },
+        load=["user"],
+    )
+
+    # Verify that the fast paths produce exactly what the response schemas do
+    schema_listing = ListingDataSchema.parse_obj(
+        {
+            "watchlist": True,
+            "time_left_seconds": listing.time_left_seconds,
+            **listing.dict(),
+        }
+    )
+    assert serialize_listing(listing, True) == jsonable_encoder(schema_listing)
+    assert serialize_bid(bid) == jsonable_encoder(BidDataSchema.from_orm(bid))
+
+
+async def test_listings_feed_cache(client, create_listing, database, mocker):
+    # Verify that the feed is served from cache and evicted by listing writes
+    response = await client.get(BASE_URL_PATH)
+    assert len(response.json()["data"]) == 1
+    hits = listings_cache.hits
+
+    response = await client.get(BASE_URL_PATH)
+    assert len(response.json()["data"]) == 1
+    assert listings_cache.hits == hits + 1
+
+    listing = create_listing["listing"]
+    await listing_manager.create(
+        database,
+        {
+            "auctioneer_id": listing.auctioneer_id,
+            "name": "Another Listing",
+            "desc": "Another description",
+            "price": 1000.00,
+            "closing_date": datetime.now() + timedelta(days=1),
+        },
+    )
+    response = await client.get(BASE_URL_PATH)
+    assert len(response.json()["data"]) == 2
+
+    # Verify that an expired entry is served stale and refreshed in the background
+    mocker.patch.object(listings_cache, "ttl", -1)
+    stale_hits = listings_cache.stale_hits
+    response = await client.get(BASE_URL_PATH)
+    assert response.status_code == 200
+    assert listings_cache.stale_hits == stale_hits + 1
+
+
+async def test_cache_loads_on_own_session(database):
+    sessions = []
+
+    async def loader(db):
+        sessions.append(db)
+        return await listing_manager.get_all(db)
+
+    # Verify that loads don't run on the (shared, maybe gone) caller's session
+    await listings_cache.warm(database, "all", loader)
+    assert sessions[0] is not database
+    assert sessions[0].bind is database.bind
+
+
+async def test_cross_worker_cache_invalidation(client, create_listing, database):
+    listener = CacheInvalidationListener(
+        database.bind.url.set(drivername="postgresql").render_as_string(
+            hide_password=False
+        )
+    )
+    listener.start()
+    await asyncio.wait_for(listener.listening.wait(), timeout=5)
+
+    await client.get(BASE_URL_PATH)
+    assert listings_cache.stats["entries"] == 1
+
+    # Verify that a listing write announced by another worker marks the feed stale
+    received = listener.received
+    payload = json.dumps({"origin": "another-worker", "table": "listings", "id": None})
+    await database.execute(select(func.pg_notify(CACHE_INVALIDATION_CHANNEL, payload)))
+    await database.commit()
+
+    for _ in range(50):
+        if listener.received > received:
+            break
+        await asyncio.sleep(0.1)
+    await listener.stop()
+    assert listings_cache.stats["entries"] == 1
+
+    # Verify that it's served while refreshed in the background
+    stale_hits, hits = listings_cache.stale_hits, listings_cache.hits
+    await client.get(BASE_URL_PATH)
+    assert listings_cache.stale_hits == stale_hits + 1
+    await client.get(BASE_URL_PATH)
+    assert listings_cache.hits == hits + 1
+
+
+async def test_coalesced_listing_lookups(create_listing, database):
+    listing = create_listing["listing"]
+    stats = single_flight.stats
+
+    # Verify that concurrent identical lookups share a single query
+    results = await asyncio.gather(
+        *[
+            listing_manager.get_coalesced(database, "get_by_slug", listing.slug)
+            for _ in range(5)
+        ]
+    )
+    assert all(result.id == listing.id for result in results)
+    assert single_flight.executions - stats["executions"] == 1
+    assert single_flight.coalesced - stats["coalesced"] == 4
+    assert single_flight.stats["inflight"] == 0
+    # Loaded on a session of their own, not the caller's
+    assert all(result not in database for result in results)
+
+    # Verify that followers are served when the caller that started the query goes away
+    lookups = [
+        asyncio.ensure_future(
+            listing_manager.get_coalesced(database, "get_by_slug", listing.slug)
+        )
+        for _ in range(2)
+    ]
+    await asyncio.sleep(0)
+    lookups[0].cancel()
+    assert (await lookups[1]).id == listing.id
+
+
 async def test_get_user_watchlists_listng(authorized_client, create_listing, database):
     listing = create_listing["listing"]
-    user_id = create_listing["user"].id
+    user_id = create_listing["user"].pkid
     await watchlist_manager.create(
-        database, {"user_id": str(user_id), "listing_id": listing.id}
+        database, {"user_id": user_id, "listing_id": listing.pkid}
     )
 
     response = await authorized_client.get(f"{BASE_URL_PATH}/watchlist")
@@ -99,6 +278,39 @@ async def test_create_or_remove_user_watchlists_listng(
     }
 
 
+async def test_read_your_writes(client, create_listing, database, mocker):
+    # A second engine on the same database stands in for a replica
+    replica = create_async_engine(database.bind.url)
+    mocker.patch("app.core.database.ReadSessionLocals", [async_sessionmaker(replica)])
+    mocker.patch("app.core.database.SessionLocal", async_sessionmaker(database.bind))
+
+    async def read_session(headers):
+        sessions = get_read_db(Request({"type": "http", "headers": headers}))
+        db = await anext(sessions)
+        await sessions.aclose()
+        return db
+
+    # Verify that reads go to the replica
+    assert (await read_session([])).bind is replica
+
+    # Verify that a write pins the client to the primary
+    response = await client.post(
+        f"{BASE_URL_PATH}/watchlist", json={"slug": create_listing["listing"].slug}
+    )
+    assert response.status_code == 201
+    assert response.headers["set-cookie"].startswith(f"{PRIMARY_PIN_COOKIE}=1")
+    cookie = (b"cookie", f"{PRIMARY_PIN_COOKIE}=1".encode())
+    db = await read_session([cookie])
+    assert db.bind is database.bind
+
+    # Verify that pinned reads skip the caches, which may hold the replica's lag
+    misses = listings_cache.misses
+    await listings_cache.get(db, "all", listing_manager.get_all, None)
+    await listings_cache.get(db, "all", listing_manager.get_all, None)
+    assert listings_cache.misses == misses + 2
+    await replica.dispose()
+
+
 async def test_retrieve_all_categories(client, database):
     # Create Category
     await category_manager.create(database, {"name": "TestCategory"})
@@ -141,8 +353,8 @@ async def test_retrieve_listing_bids(
     await bid_manager.create(
         database,
         {
-            "user_id": another_verified_user.id,
-            "listing_id": listing.id,
+            "user_id": another_verified_user.pkid,
+            "listing_id": listing.pkid,
             "amount": 10000,
         },
     )
@@ -228,3 +440,192 @@ async def test_create_bid(
     }
 
     # You can also test for other error responses.....
+
+
+async def test_unit_of_work(create_listing, another_verified_user, database, mocker):
+    listing = create_listing["listing"]
+    commit = mocker.spy(database, "commit")
+
+    # Verify that the writes of a unit of work are committed once
+    async with unit_of_work(database):
+        bid_dict = {
+            "user_id": another_verified_user.pkid,
+            "listing_id": listing.pkid,
+            "amount": 2000,
+        }
+        bid = await bid_manager.create(database, bid_dict)
+        await listing_manager.update(
+            database, listing, {"highest_bid": 2000, "bids_count": 1}
+        )
+    assert commit.call_count == 1
+
+    # Verify that a failed unit of work leaves nothing behind
+    with pytest.raises(ValueError):
+        async with unit_of_work(database):
+            await bid_manager.update(database, bid, {"amount": 3000})
+            await listing_manager.update(database, listing, {"highest_bid": 3000})
+            raise ValueError
+    assert commit.call_count == 1
+    bids = await bid_manager.get_by_listing_id(database, listing.pkid)
+    assert [bid.amount for bid in bids] == [2000]
+    listing = await listing_manager.get_by_slug(database, listing.slug)
+    assert listing.highest_bid == 2000
+
+
+async def test_writes_return_rows(
+    create_listing, another_verified_user, database, record_statements
+):
+    listing = create_listing["listing"]
+    category = await category_manager.create(database, {"name": "AnotherCategory"})
+
+    with record_statements() as statements:
+        bid_dict = {
+            "user_id": another_verified_user.pkid,
+            "listing_id": listing.pkid,
+            "amount": 5000,
+        }
+        bid = await bid_manager.create(database, bid_dict, load=["user"])
+        listing = await listing_manager.update(
+            database, listing, {"category_id": category.id}
+        )
+
+    # Verify that writes aren't followed by a SELECT to reload the rows
+    kinds = [statement.split()[0] for statement, _ in statements]
+    # Existing bid lookup first, then the bid history event and the bid
+    assert kinds == ["SELECT", "INSERT", "INSERT", "UPDATE"]
+    assert "RETURNING" in statements[2][0]
+    assert bid.amount == Decimal("5000.00")
+
+    # Verify that relationships asked for are filled from the session
+    assert bid.user is another_verified_user
+    # Others are left unloaded, stale ones expired
+    assert "category" in inspect(listing).unloaded
+    listing = await listing_manager.update(
+        database, listing, {"category_id": None}, load=["category"]
+    )
+    assert listing.category is None
+
+
+async def test_slug_allocation(create_listing, database, record_statements):
+    listing = create_listing["listing"]
+    listing_dict = {
+        "auctioneer_id": listing.auctioneer_id,
+        "name": listing.name,
+        "desc": "Same name, another listing",
+        "price": 1000.00,
+        "closing_date": datetime.now() + timedelta(days=1),
+    }
+
+    with record_statements() as statements:
+        another_listing = await listing_manager.create(database, dict(listing_dict))
+        renamed = await listing_manager.create(
+            database, {**listing_dict, "name": "Renamed Listing"}
+        )
+        renamed = await listing_manager.update(
+            database, renamed, {"name": listing.name}
+        )
+
+    # Verify that a taken slug costs no extra lookups, one statement per write
+    kinds = [statement.split()[0] for statement, _ in statements]
+    assert kinds == ["INSERT", "INSERT", "UPDATE"]
+    assert another_listing.slug.startswith(f"{listing.slug}-")
+    assert renamed.slug.startswith(f"{listing.slug}-")
+    assert len({listing.slug, another_listing.slug, renamed.slug}) == 3
+
+    # Verify that a listing keeps its own slug when renamed back to it
+    name, slug = listing.name, listing.slug
+    listing = await listing_manager.update(database, listing, {"name": "Other name"})
+    listing = await listing_manager.update(database, listing, {"name": name})
+    assert listing.slug == slug
+
+
+async def test_bid_history(create_listing, another_verified_user, database):
+    listing = create_listing["listing"]
+    today = datetime.utcnow().date()
+    created = await bid_event_manager.create_partitions(database, 2, today=today)
+    assert len(created) == 3 and created[0] == f"bid_events_{today:%Y_%m}"
+    # Verify that existing partitions are left alone
+    assert await bid_event_manager.create_partitions(database, 2, today=today) == []
+
+    bid_dict = {"user_id": another_verified_user.pkid, "listing_id": listing.pkid}
+    await bid_manager.create(database, {**bid_dict, "amount": 2000})
+    await bid_manager.create(database, {**bid_dict, "amount": 3000})
+
+    # Verify that the summary keeps the latest bid and the history every bid
+    bids = await bid_manager.get_by_listing_id(database, listing.pkid)
+    assert [bid.amount for bid in bids] == [Decimal("3000.00")]
+    events = await bid_event_manager.get_by_listing_id(database, listing.pkid)
+    assert [event.amount for event in events] == [
+        Decimal("3000.00"),
+        Decimal("2000.00"),
+    ]
+    partition = (
+        await database.execute(
+            select(func.count()).select_from(text(f"bid_events_{today:%Y_%m}"))
+        )
+    ).scalar()
+    assert partition == 2
+
+    # Verify that past months are detached, leaving the current ones readable
+    detached = await bid_event_manager.detach_partitions(
+        database, date(today.year + 1, today.month, 1)
+    )
+    assert detached == created
+    assert await bid_event_manager.get_by_listing_id(database, listing.pkid) == []
+    assert await bid_event_manager.get_partitions(database) == ["bid_events_default"]
+    for name in detached:
+        await database.execute(text(f"DROP TABLE {name}"))
+    await database.commit()
+
+    # Verify that events of months without a partition are counted
+    assert await bid_event_manager.count_unpartitioned(database) == 0
+    await bid_event_manager.append(database, another_verified_user.pkid, 1, 100)
+    assert await bid_event_manager.count_unpartitioned(database) == 1
+    await database.rollback()
+
+
+async def test_archive_closed_listings(
+    client, create_listing, another_verified_user, database
+):
+    listing = create_listing["listing"]
+    bid_dict = {"user_id": another_verified_user.pkid, "listing_id": listing.pkid}
+    await bid_manager.create(database, {**bid_dict, "amount": 2000})
+    await watchlist_manager.create(database, dict(bid_dict))
+    listing = await listing_manager.update(
+        database, listing, {"closing_date": datetime.utcnow() - timedelta(days=40)}
+    )
+    slug = listing.slug
+
+    # Verify that only listings closed before the cutoff are moved, in batches
+    cutoff = datetime.utcnow() - timedelta(days=30)
+    assert await listing_manager.archive_closed(database, cutoff, 1) == 1
+    assert await listing_manager.archive_closed(database, cutoff, 1) == 0
+    assert await listing_manager.get_by_slug(database, slug) is None
+    assert await bid_manager.get_by_listing_id(database, listing.pkid) == []
+    assert await watchlist_manager.get_by_client(database, another_verified_user) == []
+    # The bid history stays in place
+    events = await bid_event_manager.get_by_listing_id(database, listing.pkid)
+    assert len(events) == 1
+
+    # Verify that old links still resolve, with the listing's bids
+    response = await client.get(f"{BASE_URL_PATH}/detail/{slug}")
+    assert response.status_code == 200
+    assert response.json()["data"]["listing"]["slug"] == slug
+    response = await client.get(f"{BASE_URL_PATH}/detail/{slug}/bids")
+    assert response.status_code == 200
+    assert [bid["amount"] for bid in response.json()["data"]["bids"]] == [2000]
+
+    # Verify that archived listings can't be watched and keep their slug
+    response = await client.post(f"{BASE_URL_PATH}/watchlist", json={"slug": slug})
+    assert response.status_code == 404
+    new_listing = await listing_manager.create(
+        database,
+        {
+            "auctioneer_id": listing.auctioneer_id,
+            "name": listing.name,
+            "desc": "Same name as an archived listing",
+            "price": 1000.00,
+            "closing_date": datetime.now() + timedelta(days=1),
+        },
+    )
+    assert new_listing.slug.startswith(f"{slug}-")
@@ -0,0 +1,56 @@
+from app.core.config import settings
+from app.db.managers.base import file_manager
+from app.db.models.base import uuid7
+from sqlalchemy import text
+import time, uuid
+
+
+async def test_time_ordered_ids(database):
+    ids = [uuid7()]
+    for _ in range(3):
+        time.sleep(0.002)
+        ids.append(uuid7())
+    assert all(id.version == 7 for id in ids)
+    assert ids == sorted(ids) == sorted(ids, key=str)
+
+    # Verify that new rows get time-ordered ids next to existing random ones
+    legacy = await file_manager.create(
+        database, {"resource_type": "image/png", "id": uuid.uuid4()}
+    )
+    file = await file_manager.create(database, {"resource_type": "image/png"})
+    assert file.id.version == 7
+    assert await file_manager.get_by_id(database, legacy.id) is legacy
+
+
+async def test_stream(database):
+    files = [
+        await file_manager.create(database, {"resource_type": "image/gif"})
+        for _ in range(5)
+    ]
+    streamed = []
+    async for file in file_manager.stream(
+        database, file_manager.model.resource_type == "image/gif", yield_per=2
+    ):
+        streamed.append(file)
+        # Verify that the rows are fetched through a server side cursor
+        cursors = (await database.execute(text("SELECT name FROM pg_cursors"))).all()
+        assert len(cursors) == 1
+    assert streamed == files
+
+
+async def test_bulk_create(database, monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_BULK_COPY_THRESHOLD", 3)
+    monkeypatch.setattr(settings, "DATABASE_BULK_COPY_CHUNK_SIZE", 2)
+    existing = await file_manager.create(database, {"resource_type": "image/bmp"})
+    rows = [{"resource_type": "image/bmp", "id": uuid7()} for _ in range(4)]
+    rows.insert(2, {"resource_type": "image/bmp", "id": existing.id})
+
+    # Verify that the copied rows (in chunks) are inserted, conflicting ones skipped
+    ids = await file_manager.bulk_create(database, rows)
+    assert ids == [row["id"] for row in rows if row["id"] != existing.id]
+    assert set(ids) < set(await file_manager.get_all_ids(database))
+
+    # Verify that small batches are still inserted, with VALUES
+    assert await file_manager.bulk_create(database, rows[:2]) == []
+    ids = await file_manager.bulk_create(database, [{"resource_type": "image/bmp"}])
+    assert len(ids) == 1 and ids[0].version == 7
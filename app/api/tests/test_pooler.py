@@ -0,0 +1,118 @@
+from app.core.database import get_db, get_read_db, make_session_maker, pool_options
+from app.main import app
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import create_async_engine
+import asyncio
+
+SSL_REQUEST, GSSENC_REQUEST = 80877103, 80877104
+
+
+class PoolerStandIn:
+    """
+    Stands in for a transaction mode pooler (PgBouncer) between the API and Postgres.
+    It forwards the traffic as is and records the statements sent, with the names of
+    the ones that were prepared, so a test can check for what such a pooler breaks.
+    """
+
+    def __init__(self, host: str, port: int) -> None:
+        self.host = host
+        self.port = port
+        self.statements = []
+        self.named_prepares = []
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, client_reader, client_writer) -> None:
+        server_reader, server_writer = await asyncio.open_connection(
+            self.host, self.port
+        )
+        replies = asyncio.ensure_future(self.forward(server_reader, client_writer))
+        try:
+            await self.inspect(client_reader, server_writer)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            replies.cancel()
+            server_writer.close()
+            client_writer.close()
+
+    async def forward(self, reader, writer) -> None:
+        while data := await reader.read(65536):
+            writer.write(data)
+            await writer.drain()
+
+    async def inspect(self, reader, writer) -> None:
+        # Untyped startup messages, after any encryption requests (the server declines)
+        while True:
+            length = int.from_bytes(await reader.readexactly(4), "big")
+            body = await reader.readexactly(length - 4)
+            writer.write(length.to_bytes(4, "big") + body)
+            if int.from_bytes(body[:4], "big") not in (SSL_REQUEST, GSSENC_REQUEST):
+                break
+
+        while True:
+            kind = await reader.readexactly(1)
+            length = await reader.readexactly(4)
+            body = await reader.readexactly(int.from_bytes(length, "big") - 4)
+            if kind == b"P":  # Parse: statement name, query
+                name, query = body.split(b"\0")[:2]
+                self.statements.append(query.decode())
+                if name:
+                    self.named_prepares.append(query.decode())
+            elif kind == b"Q":  # Simple query
+                self.statements.append(body.rstrip(b"\0").decode())
+            writer.write(kind + length + body)
+            await writer.drain()
+
+
+async def test_api_behind_transaction_pooler(database, create_listing):
+    url = database.bind.url
+    pooler = PoolerStandIn(url.host, url.port)
+    port = await pooler.start()
+    engine = create_async_engine(
+        url.set(host="127.0.0.1", port=port),
+        **pool_options("test", 1, 0, 5000, pooler=True),
+    )
+    session_maker = make_session_maker(engine, 5000, pooler=True)
+
+    async def override_get_db():
+        async with session_maker() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    try:
+        async with AsyncClient(app=app, base_url="http://test/api/v6") as client:
+            slug = create_listing["listing"].slug
+            # Repeated often enough to be prepared outside pooler mode
+            for _ in range(5):
+                response = await client.get(f"/listings/detail/{slug}")
+                assert response.status_code == 200
+                response = await client.get("/general/reviews")
+                assert response.status_code == 200
+            response = await client.post("/listings/watchlist", json={"slug": slug})
+            assert response.status_code == 201
+    finally:
+        app.dependency_overrides.pop(get_db)
+        app.dependency_overrides.pop(get_read_db)
+        await engine.dispose()
+        await pooler.stop()
+
+    # Verify that nothing relied on the server connection outliving a transaction
+    assert pooler.named_prepares == []
+    session_sets = [
+        statement
+        for statement in pooler.statements
+        if statement.upper().startswith("SET ")
+        and not statement.upper().startswith("SET LOCAL ")
+    ]
+    assert session_sets == []
+
+    # Verify that the statement timeout is still applied, per transaction
+    assert "SET LOCAL statement_timeout = 5000" in pooler.statements
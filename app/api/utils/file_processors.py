@@ -3,9 +3,14 @@ import time
 import cloudinary
 import cloudinary.uploader
 import mimetypes
+from functools import lru_cache
 
 BASE_FOLDER = "bidout-auction-v6/"
 
+# Urls are a pure function of (key, folder, content_type), so they are memoized.
+# Bounded to roughly the number of images/avatars a worker serves at once.
+FILE_URL_CACHE_SIZE = 4096
+
 # FILES CONFIG WITH CLOUDINARY
 cloudinary.config(
     cloud_name=settings.CLOUDINARY_CLOUD_NAME,
@@ -32,6 +37,8 @@ class FileProcessor:
             print(e)
             pass
 
+    @staticmethod
+    @lru_cache(maxsize=FILE_URL_CACHE_SIZE)
     def generate_file_url(key, folder, content_type):
         file_extension = mimetypes.guess_extension(content_type)
         key = f"{BASE_FOLDER}{folder}/{key}{file_extension}"
@@ -0,0 +1,90 @@
+from decimal import Decimal
+from pydantic.json import decimal_encoder
+from pytz import UTC
+from typing import Any, Optional
+
+from app.api.utils.file_processors import FileProcessor
+from app.common.responses import APIResponse
+
+# Fast paths for the hot read payloads. They build the exact json the response schemas
+# (ListingDataSchema, BidDataSchema, ReviewsDataSchema) would produce, without running
+# their validators per row or FastAPI validating the returned dict against the schema
+# again.
+# The schemas stay the routes' return annotations, so the openapi docs don't change.
+
+
+def serialize_date(value) -> str:
+    # The schemas strftime naive utc datetimes with a 'Z', which is parsed back as utc
+    return value.replace(tzinfo=UTC).isoformat()
+
+
+def serialize_decimal(value):
+    if not isinstance(value, Decimal):
+        # As the schemas' Decimal fields would coerce it
+        value = Decimal(str(value))
+    return decimal_encoder(value)
+
+
+def serialize_avatar(user) -> Optional[str]:
+    if not user.avatar_id:
+        return None
+    return FileProcessor.generate_file_url(
+        key=user.avatar_id,
+        folder="avatars",
+        content_type=user.avatar.resource_type,
+    )
+
+
+def serialize_listing(listing, watchlist: Optional[bool] = None) -> dict:
+    auctioneer = listing.auctioneer
+    category = listing.category
+    image = listing.image
+    time_left_seconds = int(listing.time_left_seconds)
+    return {
+        "name": listing.name,
+        "auctioneer": {
+            "id": str(auctioneer.id),
+            "name": auctioneer.full_name,
+            "avatar": serialize_avatar(auctioneer),
+        },
+        "slug": listing.slug,
+        "desc": listing.desc,
+        "category": category.name if category else "Other",
+        "price": serialize_decimal(listing.price),
+        "closing_date": serialize_date(listing.closing_date),
+        "time_left_seconds": time_left_seconds,
+        "active": bool(listing.active and time_left_seconds > 0),
+        "bids_count": listing.bids_count,
+        "highest_bid": serialize_decimal(listing.highest_bid),
+        "image": FileProcessor.generate_file_url(
+            key=image.id, folder="listings", content_type=image.resource_type
+        )
+        if image
+        else None,
+        "watchlist": watchlist,
+    }
+
+
+def serialize_bid(bid) -> dict:
+    user = bid.user
+    return {
+        "user": {"name": user.full_name, "avatar": serialize_avatar(user)},
+        "amount": serialize_decimal(bid.amount),
+        "created_at": serialize_date(bid.created_at),
+        "updated_at": serialize_date(bid.updated_at),
+    }
+
+
+def serialize_review(review) -> dict:
+    reviewer = review.reviewer
+    return {
+        "reviewer": {"name": reviewer.full_name, "avatar": serialize_avatar(reviewer)},
+        "text": review.text,
+    }
+
+
+def fast_response(message: str, data: Any, status_code: int = 200) -> APIResponse:
+    return APIResponse(
+        {"status": "success", "message": message, "data": data},
+        status_code=status_code,
+    )
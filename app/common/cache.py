@@ -0,0 +1,245 @@
+from fastapi import BackgroundTasks
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Tuple
+import asyncio, json, logging, os, time, uuid
+
+import psycopg
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.common.shared_cache import SharedMemoryTier
+from app.common.singleflight import single_flight
+from app.core.database import PINNED_TO_PRIMARY, sibling_session
+
+logger = logging.getLogger(__name__)
+
+# Called with a session of its own, see StaleWhileRevalidateCache._load
+Loader = Callable[[AsyncSession], Awaitable[Any]]
+
+# Postgres channel writes are announced on, so every worker can evict its own caches
+CACHE_INVALIDATION_CHANNEL = "cache_invalidation"
+# Identifies this worker, so it can skip notifications for writes it already evicted
+# locally
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+class StaleWhileRevalidateCache:
+    """
+    In-process cache for hot read payloads.
+    * Fresher than `ttl` seconds: served as is.
+    * Between `ttl` and `max_stale` seconds: served stale while a background task
+      refreshes it.
+    * Older than `max_stale` (or missing): loaded inline, so staleness is hard
+      bounded.
+    `tables` are the tables the payload is built from, writes to any of them evict the
+    cache.
+    `shared` puts a host level tier under the worker's entries, so workers on a host
+    share one load. Only for loaders returning json-able payloads.
+    Loaders run on a sibling of the session they're given (see sibling_session), as a
+    load can be shared by other requests and a refresh outlives its request. Sessions
+    pinned to the primary always load, and store what they loaded for everyone.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: int,
+        max_stale: int,
+        tables: Iterable[str] = (),
+        shared: Optional[SharedMemoryTier] = None,
+    ) -> None:
+        self.name = name
+        self.ttl = ttl
+        self.max_stale = max(ttl, max_stale)
+        self.tables = set(tables)
+        self.shared = shared
+        self._entries: Dict[Hashable, Tuple[Any, float]] = {}
+        self._refreshing = set()
+        # Bumped on invalidation so loads that started before it are not stored
+        self._generation = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        caches[name] = self
+
+    async def get(
+        self,
+        db: AsyncSession,
+        key: Hashable,
+        loader: Loader,
+        background_tasks: BackgroundTasks,
+    ) -> Any:
+        if db.info.get(PINNED_TO_PRIMARY):
+            self.misses += 1
+            return await self._load(db, key, loader)
+
+        entry = self._entries.get(key)
+        if self.shared and not self._is_servable(entry):
+            entry = self.shared.get(self.name, key)
+            if entry:
+                self._entries[key] = entry
+        age = time.time() - entry[1] if entry else None
+        if age is None or age > self.max_stale:
+            self.misses += 1
+            return await self._load(db, key, loader)
+
+        if age > self.ttl:
+            self.stale_hits += 1
+            if key not in self._refreshing:
+                self._refreshing.add(key)
+                background_tasks.add_task(self._refresh, db, key, loader)
+        else:
+            self.hits += 1
+        return entry[0]
+
+    async def warm(self, db: AsyncSession, key: Hashable, loader: Loader) -> Any:
+        """
+        Fill an entry ahead of traffic. With a shared tier only one worker per host
+        loads it.
+        """
+        entry = self._entries.get(key)
+        if self.shared and not self._is_servable(entry):
+            entry = self.shared.get(self.name, key)
+        if entry and time.time() - entry[1] <= self.ttl:
+            self._entries[key] = entry
+            return entry[0]
+        return await self._load(db, key, loader)
+
+    async def _load(self, db: AsyncSession, key: Hashable, loader: Loader) -> Any:
+        async def load():
+            async with sibling_session(db) as own_db:
+                return await loader(own_db)
+
+        # Concurrent misses for the same key (and database) share one load
+        generation = self._generation
+        value = await single_flight.do(("cache", self.name, key, db.bind), load)
+        if generation == self._generation:
+            self._entries[key] = (value, time.time())
+            if self.shared:
+                self.shared.set(self.name, key, value)
+        return value
+
+    def _is_servable(self, entry: Optional[Tuple[Any, float]]) -> bool:
+        return bool(entry) and time.time() - entry[1] <= self.max_stale
+
+    async def _refresh(self, db: AsyncSession, key: Hashable, loader: Loader) -> None:
+        try:
+            await self._load(db, key, loader)
+        finally:
+            self._refreshing.discard(key)
+
+    def invalidate(
+        self, key: Optional[Hashable] = None, local: bool = False, stale: bool = False
+    ) -> None:
+        """
+        Evict a key (every key if none is given). `stale` ages it past the ttl instead,
+        so it's still served while a refresh runs (and loaded inline past max_stale).
+        `local` leaves the host level tier alone.
+        """
+        # Loads that started before now are not stored
+        self._generation += 1
+        if stale:
+            stored_at = time.time() - self.ttl - 1
+            for entry_key in list(self._entries) if key is None else [key]:
+                entry = self._entries.get(entry_key)
+                if entry:
+                    self._entries[entry_key] = (entry[0], min(entry[1], stored_at))
+        elif key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+        if self.shared and not local:
+            if stale:
+                self.shared.expire(self.name, key, stored_at)
+            else:
+                self.shared.delete(self.name, key)
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+        }
+
+
+caches: Dict[str, StaleWhileRevalidateCache] = {}
+
+
+def invalidate_tables(*tables: str, local: bool = False, stale: bool = False) -> None:
+    """
+    Evict every cache built from any of the given tables (all caches if none is given).
+    `local` and `stale` as in StaleWhileRevalidateCache.invalidate.
+    """
+    for cache in caches.values():
+        if not tables or cache.tables.intersection(tables):
+            cache.invalidate(local=local, stale=stale)
+
+
+def is_cached(table: str) -> bool:
+    return any(table in cache.tables for cache in caches.values())
+
+
+def invalidation_payload(table: str, id: Optional[Any] = None) -> str:
+    return json.dumps(
+        {"origin": WORKER_ID, "table": table, "id": str(id) if id else None}
+    )
+
+
+class CacheInvalidationListener:
+    """
+    Keeps a dedicated LISTEN connection and marks the caches named in notifications
+    sent by other workers stale (see BaseManager.notify_write).
+    """
+
+    def __init__(self, url: str, reconnect_seconds: float = 1) -> None:
+        self.url = url
+        self.reconnect_seconds = reconnect_seconds
+        self.listening = asyncio.Event()
+        self.received = 0
+        self.connections = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._listen()
+            except (psycopg.Error, OSError) as e:
+                logger.warning(f"Cache invalidation listener disconnected: {e}")
+            self.listening.clear()
+            await asyncio.sleep(self.reconnect_seconds)
+
+    async def _listen(self) -> None:
+        async with await psycopg.AsyncConnection.connect(
+            self.url, autocommit=True
+        ) as conn:
+            await conn.execute(f"LISTEN {CACHE_INVALIDATION_CHANNEL}")
+            if self.connections:
+                # Anything written while we weren't listening is unknown, start clean.
+                # Workers that stayed connected kept the host level tier up to date.
+                invalidate_tables(local=True)
+            self.connections += 1
+            self.listening.set()
+            async for notify in conn.notifies():
+                self.handle(notify.payload)
+
+    def handle(self, payload: str) -> None:
+        self.received += 1
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return invalidate_tables()
+        if message.get("origin") != WORKER_ID:
+            # Served stale while refreshed, rather than every worker loading inline at
+            # once after each write
+            invalidate_tables(message["table"], stale=True)
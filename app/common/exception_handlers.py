@@ -1,6 +1,6 @@
 from fastapi import HTTPException, status
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from app.common.responses import ORJSONResponse
 from http import HTTPStatus
 
 
@@ -32,12 +32,12 @@ def request_error_handler(request, exc: RequestError):
     }
     if exc.data:
         err_dict["data"] = exc.data
-    return JSONResponse(status_code=exc.status_code, content=err_dict)
+    return ORJSONResponse(status_code=exc.status_code, content=err_dict)
 
 
 def http_exception_handler(request, exc):
     if isinstance(exc, HTTPException):
-        return JSONResponse(
+        return ORJSONResponse(
             content={"status": "failure", "message": exc.detail},
             status_code=exc.status_code,
         )
@@ -54,7 +54,7 @@ def validation_exception_handler(request, exc: RequestValidationError):
             field_name = error["loc"][0]
 
         modified_details[f"{field_name}"] = error["msg"]
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         content={
             "status": "failure",
@@ -66,7 +66,7 @@ def validation_exception_handler(request, exc: RequestValidationError):
 
 def internal_server_error_handler(request, exc: Exception):
     print(exc)
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={
             "status": "failure",
@@ -0,0 +1,141 @@
+from contextvars import ContextVar
+from decimal import Decimal
+from fastapi import Request
+from fastapi.responses import ORJSONResponse as BaseORJSONResponse
+from fastapi.routing import APIRoute
+from pydantic.json import decimal_encoder
+from typing import Any, Callable, List, Mapping, Optional
+
+import msgpack, orjson
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+# Media type negotiated for the current request (None on routes without negotiation)
+negotiated_media_type: ContextVar[Optional[str]] = ContextVar(
+    "negotiated_media_type", default=None
+)
+
+
+def orjson_default(obj: Any) -> Any:
+    # Prices: same int/float output FastAPI's jsonable_encoder gives
+    if isinstance(obj, Decimal):
+        return decimal_encoder(obj)
+    raise TypeError
+
+
+def json_dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=orjson_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def msgpack_dumps(content: Any) -> bytes:
+    return msgpack.packb(content, default=orjson_default)
+
+
+class ORJSONResponse(BaseORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        return json_dumps(content)
+
+
+class APIResponse(ORJSONResponse):
+    """
+    Json by default, MessagePack when the route negotiated it (see NegotiatedRoute).
+    Both encode the same content, so the response schemas are the same for either.
+    """
+
+    def __init__(
+        self,
+        content: Any = None,
+        status_code: int = 200,
+        headers: Optional[Mapping[str, str]] = None,
+        media_type: Optional[str] = None,
+        background=None,
+    ) -> None:
+        negotiated = negotiated_media_type.get()
+        if negotiated and not media_type:
+            media_type = negotiated
+            headers = {**(headers or {}), "vary": "Accept"}
+        super().__init__(content, status_code, headers, media_type, background)
+
+    def render(self, content: Any) -> bytes:
+        if self.media_type in MSGPACK_MEDIA_TYPES:
+            return msgpack_dumps(content)
+        return json_dumps(content)
+
+
+def quality(params: List[str]) -> float:
+    # The q parameter of a media range (1 when missing, 0 when malformed)
+    for param in params:
+        name, _, value = param.partition("=")
+        if name.strip().lower() == "q":
+            try:
+                return float(value)
+            except ValueError:
+                return 0
+    return 1
+
+
+def negotiate_media_type(accept: str) -> str:
+    """
+    The acceptable media type with the highest quality. Json wins ties, and is what
+    wildcards (or no Accept header) get, msgpack has to be asked for by name.
+    """
+    qualities = {}
+    for media_range in accept.split(","):
+        media_type, *params = [part.strip() for part in media_range.split(";")]
+        qualities[media_type.lower()] = quality(params)
+
+    # The most specific range matching json sets its quality
+    json_quality = next(
+        (
+            qualities[media_range]
+            for media_range in (JSON_MEDIA_TYPE, "application/*", "*/*")
+            if media_range in qualities
+        ),
+        0,
+    )
+    media_type = JSON_MEDIA_TYPE
+    best_quality = json_quality
+    for msgpack_type in MSGPACK_MEDIA_TYPES:
+        if qualities.get(msgpack_type, 0) > best_quality:
+            media_type, best_quality = msgpack_type, qualities[msgpack_type]
+    return media_type
+
+
+class ORJSONRequest(Request):
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            # orjson.JSONDecodeError subclasses json.JSONDecodeError, so FastAPI still
+            # handles bad bodies
+            self._json = orjson.loads(await self.body())
+        return self._json
+
+
+class ORJSONRoute(APIRoute):
+    """Decodes json request bodies with orjson"""
+
+    def get_route_handler(self) -> Callable:
+        route_handler = super().get_route_handler()
+
+        async def orjson_route_handler(request: Request):
+            return await route_handler(ORJSONRequest(request.scope, request.receive))
+
+        return orjson_route_handler
+
+
+class NegotiatedRoute(ORJSONRoute):
+    """Honours 'Accept: application/msgpack', for routes returning APIResponse"""
+
+    def get_route_handler(self) -> Callable:
+        route_handler = super().get_route_handler()
+
+        async def negotiated_route_handler(request: Request):
+            token = negotiated_media_type.set(
+                negotiate_media_type(request.headers.get("accept", ""))
+            )
+            try:
+                return await route_handler(request)
+            finally:
+                negotiated_media_type.reset(token)
+
+        return negotiated_route_handler
@@ -0,0 +1,222 @@
+from typing import Any, Hashable, Optional, Tuple
+import fcntl, hashlib, mmap, os, struct, time
+
+import orjson
+
+from app.core.config import settings
+
+# Bump LAYOUT_VERSION whenever the layout below changes, workers from a new deploy
+# then reset the file
+MAGIC = b"BIDOUTSC"
+LAYOUT_VERSION = 1
+
+# magic, layout version, slots, slot size, host hits, host misses, host stores
+HEADER = struct.Struct("<8sQQQQQQ")
+HEADER_SIZE = 64
+HITS_OFFSET, MISSES_OFFSET, STORES_OFFSET = 32, 40, 48
+# cache name hash, key hash, sequence (odd while being written), stored at (unix time),
+# length
+SLOT = struct.Struct("<QQQdI")
+SLOT_SIZE = 40
+
+
+def _hash(value: Any) -> int:
+    # Never 0, which marks an empty slot
+    digest = hashlib.blake2b(repr(value).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1
+
+
+class SharedMemoryTier:
+    """
+    Host level cache shared by all workers through an mmap'd file (put it on /dev/shm).
+    A small direct-mapped index of fixed size slots holds orjson encoded values:
+    * Writers take an exclusive flock and bump the slot sequence around the write.
+    * Readers don't lock, they decode straight from the mapping and retry if the
+      sequence moved.
+    The file is opened on first use in each process, so workers forked after import
+    have their own descriptor (flock locks are per open file, not per process).
+    """
+
+    def __init__(self, path: str, slots: int = 256, slot_size: int = 64 * 1024):
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        self.data_offset = HEADER_SIZE + slots * SLOT_SIZE
+        self._pid = None
+
+    def _open(self) -> None:
+        size = self.data_offset + self.slots * self.slot_size
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._pid = os.getpid()
+        with self._lock():
+            if os.fstat(self._fd).st_size < size:
+                os.ftruncate(self._fd, size)
+            self._map = mmap.mmap(self._fd, size)
+            magic, version, saved_slots, saved_slot_size, *_ = HEADER.unpack_from(
+                self._map, 0
+            )
+            if (magic, version, saved_slots, saved_slot_size) != (
+                MAGIC,
+                LAYOUT_VERSION,
+                self.slots,
+                self.slot_size,
+            ):
+                self._map[:size] = bytes(size)
+                HEADER.pack_into(
+                    self._map,
+                    0,
+                    MAGIC,
+                    LAYOUT_VERSION,
+                    self.slots,
+                    self.slot_size,
+                    0,
+                    0,
+                    0,
+                )
+
+    def _ensure_open(self) -> None:
+        # Opened (again) in each process, a forked worker must not share its parent's fd
+        if self._pid != os.getpid():
+            self._open()
+
+    def _lock(self):
+        return _FileLock(self._fd)
+
+    def _slot(self, name_hash: int, key_hash: int) -> Tuple[int, int]:
+        index = (name_hash ^ key_hash) % self.slots
+        slot_offset = HEADER_SIZE + index * SLOT_SIZE
+        return slot_offset, self.data_offset + index * self.slot_size
+
+    def _increment(self, offset: int) -> None:
+        # Exact under the lock, hits and misses are counted without it (approximate)
+        (value,) = struct.unpack_from("<Q", self._map, offset)
+        struct.pack_into("<Q", self._map, offset, value + 1)
+
+    def get(self, name: str, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """Returns (value, stored_at unix time) or None"""
+        self._ensure_open()
+        name_hash, key_hash = _hash(name), _hash(key)
+        slot_offset, data_offset = self._slot(name_hash, key_hash)
+        for _ in range(3):
+            saved_name, saved_key, seq, stored_at, length = SLOT.unpack_from(
+                self._map, slot_offset
+            )
+            if (saved_name, saved_key) != (name_hash, key_hash) or not length:
+                break
+            if seq % 2:
+                continue
+            try:
+                value = orjson.loads(
+                    memoryview(self._map)[data_offset : data_offset + length]
+                )
+            except orjson.JSONDecodeError:
+                continue
+            if SLOT.unpack_from(self._map, slot_offset)[2] == seq:
+                self._increment(HITS_OFFSET)
+                return value, stored_at
+        self._increment(MISSES_OFFSET)
+        return None
+
+    def set(self, name: str, key: Hashable, value: Any) -> bool:
+        data = orjson.dumps(value)
+        if len(data) > self.slot_size:
+            return False
+        self._ensure_open()
+        name_hash, key_hash = _hash(name), _hash(key)
+        slot_offset, data_offset = self._slot(name_hash, key_hash)
+        with self._lock():
+            seq = SLOT.unpack_from(self._map, slot_offset)[2]
+            SLOT.pack_into(self._map, slot_offset, 0, 0, seq + 1, 0, 0)
+            self._map[data_offset : data_offset + len(data)] = data
+            SLOT.pack_into(
+                self._map,
+                slot_offset,
+                name_hash,
+                key_hash,
+                seq + 2,
+                time.time(),
+                len(data),
+            )
+            self._increment(STORES_OFFSET)
+        return True
+
+    def delete(self, name: str, key: Optional[Hashable] = None) -> None:
+        """Delete a key, or every key of the named cache"""
+        name_hash = _hash(name)
+        key_hash = _hash(key) if key is not None else None
+        self._ensure_open()
+        with self._lock():
+            for index in range(self.slots):
+                slot_offset = HEADER_SIZE + index * SLOT_SIZE
+                saved_name, saved_key, seq, _, _ = SLOT.unpack_from(
+                    self._map, slot_offset
+                )
+                if saved_name == name_hash and key_hash in (None, saved_key):
+                    SLOT.pack_into(self._map, slot_offset, 0, 0, seq + 2, 0, 0)
+
+    def expire(self, name: str, key: Optional[Hashable], stored_at: float) -> None:
+        """
+        Backdate a key, or every key of the named cache, to `stored_at` (if it's
+        newer), so it reads as stale but keeps its value
+        """
+        name_hash = _hash(name)
+        key_hash = _hash(key) if key is not None else None
+        self._ensure_open()
+        with self._lock():
+            for index in range(self.slots):
+                slot_offset = HEADER_SIZE + index * SLOT_SIZE
+                saved_name, saved_key, seq, saved_at, length = SLOT.unpack_from(
+                    self._map, slot_offset
+                )
+                if saved_name != name_hash or key_hash not in (None, saved_key):
+                    continue
+                SLOT.pack_into(self._map, slot_offset, 0, 0, seq + 1, 0, 0)
+                SLOT.pack_into(
+                    self._map,
+                    slot_offset,
+                    saved_name,
+                    saved_key,
+                    seq + 2,
+                    min(saved_at, stored_at),
+                    length,
+                )
+
+    @property
+    def stats(self) -> dict:
+        self._ensure_open()
+        *_, hits, misses, stores = HEADER.unpack_from(self._map, 0)
+        lookups = hits + misses
+        return {
+            "host_hits": hits,
+            "host_misses": misses,
+            "host_stores": stores,
+            "host_hit_rate": round(hits / lookups, 4) if lookups else None,
+        }
+
+    def close(self) -> None:
+        if self._pid == os.getpid():
+            self._map.close()
+            os.close(self._fd)
+            self._pid = None
+
+
+class _FileLock:
+    def __init__(self, fd: int) -> None:
+        self.fd = fd
+
+    def __enter__(self):
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *args):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+
+shared_cache: Optional[SharedMemoryTier] = (
+    SharedMemoryTier(
+        settings.SHARED_CACHE_PATH,
+        slots=settings.SHARED_CACHE_SLOTS,
+        slot_size=settings.SHARED_CACHE_SLOT_SIZE,
+    )
+    if settings.SHARED_CACHE_PATH
+    else None
+)
@@ -0,0 +1,78 @@
+from fastapi import FastAPI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from sqlalchemy.pool import NullPool
+import asyncio, logging, time, uuid
+
+from app.api.routes.general import load_sitedetail, sitedetail_cache
+from app.api.routes.listings import categories_cache, listings_cache, load_categories
+from app.api.utils.serializers import serialize_listing
+from app.core.config import settings
+from app.db.managers.accounts import jwt_manager, user_manager
+from app.db.managers.general import review_manager
+from app.db.managers.listings import bid_manager, listing_manager, watchlist_manager
+from app.db.models.accounts import User
+
+logger = logging.getLogger(__name__)
+
+
+class Timer:
+    def __init__(self, phase: str) -> None:
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *args):
+        elapsed = (time.perf_counter() - self.start) * 1000
+        logger.info(f"Warm-up: {self.phase} took {elapsed:.1f}ms")
+
+
+async def open_connection(engine: AsyncEngine) -> None:
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+async def warm_up(
+    app: FastAPI, engine: AsyncEngine, session_maker: async_sessionmaker
+) -> None:
+    """
+    Pays the cold start costs before the worker takes traffic: pool connections,
+    compiled statement caches for the hot manager queries, in-process caches, file urls
+    and the openapi schema.
+    """
+    with Timer("everything"):
+        # Without a pool (pooler mode) connections aren't kept, nothing to fill
+        if not isinstance(engine.pool, NullPool):
+            with Timer(f"opening {settings.WARMUP_CONNECTIONS} pool connections"):
+                await asyncio.gather(
+                    *[
+                        open_connection(engine)
+                        for _ in range(settings.WARMUP_CONNECTIONS)
+                    ]
+                )
+
+        async with session_maker() as db:
+            with Timer("hot manager queries"):
+                # Values don't matter, running them compiles and caches the statements
+                missing_id, missing_pkid = uuid.uuid4(), 0
+                await listing_manager.get_by_slug(db, "")
+                await listing_manager.get_related_listings(db, missing_id, "")
+                await bid_manager.get_by_listing_id(db, missing_pkid)
+                await watchlist_manager.get_listing_ids_by_client(
+                    db, User(pkid=missing_pkid)
+                )
+                await user_manager.get_by_email(db, "")
+                await jwt_manager.get_by_user_id(db, missing_id)
+                await review_manager.get_active(db)
+
+            with Timer("caches"):
+                listings = await listings_cache.warm(db, "all", listing_manager.get_all)
+                await categories_cache.warm(db, "all", load_categories)
+                await sitedetail_cache.warm(db, "detail", load_sitedetail)
+
+        with Timer("schemas and serializers"):
+            app.openapi()
+            for listing in listings:
+                # Also fills the file url cache
+                serialize_listing(listing)
@@ -31,6 +31,79 @@ class Settings(BaseSettings):
     POSTGRES_PORT: str
     POSTGRES_DB: str
     SQLALCHEMY_DATABASE_URL: Optional[str] = None
+    # Connection pools. Timeout and recycle are in seconds, recycle of -1 never
+    # recycles.
+    DATABASE_POOL_TIMEOUT: int = 10
+    DATABASE_POOL_RECYCLE: int = 1800
+    DATABASE_POOL_PRE_PING: bool = True
+    DATABASE_APPLICATION_NAME: str = "bidout-auction"
+    # Each workload has its own pool so jobs can't starve requests.
+    # Statement timeouts are in milliseconds, 0 disables them.
+    DATABASE_POOL_SIZE: int = 20  # interactive (requests)
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_STATEMENT_TIMEOUT: int = 15000
+    READ_STATEMENT_TIMEOUT: int = 3000  # read-only routes (get_read_db)
+    BACKGROUND_DATABASE_POOL_SIZE: int = 5  # background tasks and scheduled jobs
+    BACKGROUND_DATABASE_MAX_OVERFLOW: int = 5
+    BACKGROUND_DATABASE_STATEMENT_TIMEOUT: int = 60000
+    BULK_DATABASE_POOL_SIZE: int = 2  # seeding, exports and migrations
+    BULK_DATABASE_MAX_OVERFLOW: int = 0
+    BULK_DATABASE_STATEMENT_TIMEOUT: int = 0
+    # Server-side prepared statements: a query is prepared on a connection once it ran
+    # this many times there (None disables). The compiled cache holds SQLAlchemy's
+    # compiled statements, sized well above our manager queries and their eager load
+    # variants.
+    DATABASE_PREPARE_THRESHOLD: Optional[int] = 2
+    DATABASE_COMPILED_CACHE_SIZE: int = 1000
+    # Rows fetched per round trip by BaseManager.stream (server side cursor)
+    DATABASE_STREAM_YIELD_PER: int = 1000
+    # BaseManager.bulk_create COPYs batches from this many rows, this many at a time
+    DATABASE_BULK_COPY_THRESHOLD: int = 1000
+    DATABASE_BULK_COPY_CHUNK_SIZE: int = 100_000
+    # Set when connecting through a transaction mode pooler (e.g PgBouncer), see
+    # pool_options.
+    # LISTEN and migrations hold a session, they use the direct url if given.
+    DATABASE_POOLER_MODE: bool = False
+    SQLALCHEMY_DIRECT_DATABASE_URL: Optional[str] = None
+    # Read replicas (space separated urls) for read-only routes. Reads go to the
+    # primary if unset.
+    SQLALCHEMY_READ_DATABASE_URLS: Union[List, str] = []
+    # Seconds a client reads from the primary after writing, so it sees its own writes
+    READ_YOUR_WRITES_WINDOW: int = 5
+
+    # CACHING (seconds). Entries older than the ttl are served stale and refreshed in
+    # the background, entries older than the max stale are reloaded before responding.
+    LISTINGS_CACHE_TTL: int = 5
+    LISTINGS_CACHE_MAX_STALE: int = 60
+    CATEGORY_LISTINGS_CACHE_TTL: int = 5
+    CATEGORY_LISTINGS_CACHE_MAX_STALE: int = 60
+    CATEGORIES_CACHE_TTL: int = 60
+    CATEGORIES_CACHE_MAX_STALE: int = 600
+    SITE_DETAIL_CACHE_TTL: int = 60
+    SITE_DETAIL_CACHE_MAX_STALE: int = 600
+    # Evict caches on writes made by other workers (Postgres LISTEN/NOTIFY)
+    CACHE_INVALIDATION_LISTENER: bool = True
+    # Host level cache tier shared by all workers on a host (e.g /dev/shm/bidout-cache).
+    # Disabled if unset.
+    SHARED_CACHE_PATH: Optional[str] = None
+    SHARED_CACHE_SLOTS: int = 256
+    SHARED_CACHE_SLOT_SIZE: int = 64 * 1024
+
+    # BID HISTORY (bid_events, range partitioned by month). Months created ahead at
+    # startup and by jobs/bid_event_partitions.py, which also detaches months older than
+    # BID_EVENTS_KEEP_MONTHS (None keeps them all).
+    BID_EVENTS_PARTITIONS_AHEAD: int = 2
+    BID_EVENTS_KEEP_MONTHS: Optional[int] = None
+
+    # ARCHIVAL (jobs/archive_listings.py). Listings closed this many days ago move to
+    # the archive tables with their bids and watchlists, in transactions of a batch of
+    # listings.
+    ARCHIVE_LISTINGS_AFTER_DAYS: int = 30
+    ARCHIVE_BATCH_SIZE: int = 500
+
+    # STARTUP WARM-UP (pool connections, hot queries and caches before taking traffic)
+    WARMUP_ON_STARTUP: bool = True
+    WARMUP_CONNECTIONS: int = 5
 
     # FIRST SUPERUSER
     FIRST_SUPERUSER_EMAIL: EmailStr
@@ -83,6 +156,10 @@ class Settings(BaseSettings):
             path=f"/{values.get('POSTGRES_DB')}",
         )
 
+    @validator("SQLALCHEMY_READ_DATABASE_URLS", pre=True)
+    def assemble_read_database_urls(cls, v):
+        return v.split() if isinstance(v, str) else v
+
     @validator("CORS_ALLOWED_ORIGINS", pre=True)
     def assemble_cors_origins(cls, v):
         return v.split()
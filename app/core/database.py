@@ -1,13 +1,224 @@
+from fastapi import Request
+from http.cookies import SimpleCookie
+from sqlalchemy import event, exc
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from typing import Optional
+import asyncio, random, time
 
 from .config import settings
 
 Base = declarative_base()
 
-engine = create_async_engine(settings.SQLALCHEMY_DATABASE_URL)
 
-SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
+class MeteredPool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that also records how long checkouts wait for a connection,
+    so pool starvation shows up in the metrics endpoint.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            # Includes the time spent opening new connections
+            elapsed = time.perf_counter() - start
+            self.checkouts += 1
+            self.wait_time += elapsed
+            self.max_wait_time = max(self.max_wait_time, elapsed)
+
+    @property
+    def stats(self) -> dict:
+        return {
+            "size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": self.checkedout(),
+            "checked_in": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self.wait_time / self.checkouts * 1000, 3)
+            if self.checkouts
+            else 0.0,
+            "max_wait_ms": round(self.max_wait_time * 1000, 3),
+        }
+
+
+def pool_options(
+    name: str,
+    pool_size: int,
+    max_overflow: int,
+    statement_timeout: int,
+    pooler: bool = settings.DATABASE_POOLER_MODE,
+) -> dict:
+    # Named in pg_stat_activity, so each workload's connections can be told apart
+    application_name = f"{settings.DATABASE_APPLICATION_NAME}:{name}"
+    connect_args = {"application_name": application_name}
+    if pooler:
+        # Behind a transaction mode pooler consecutive transactions can run on different
+        # server connections: no named prepares, no startup settings (timeouts are set
+        # per transaction, see make_session_maker) and pooling is left to the pooler.
+        connect_args["prepare_threshold"] = None
+        return {
+            "poolclass": NullPool,
+            "connect_args": connect_args,
+            "query_cache_size": settings.DATABASE_COMPILED_CACHE_SIZE,
+        }
+
+    # Hot manager queries compile to the same sql every time, so they get prepared
+    connect_args["prepare_threshold"] = settings.DATABASE_PREPARE_THRESHOLD
+    if statement_timeout:
+        connect_args["options"] = f"-c statement_timeout={statement_timeout}"
+    return {
+        "poolclass": MeteredPool,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.DATABASE_POOL_TIMEOUT,
+        "pool_recycle": settings.DATABASE_POOL_RECYCLE,
+        "pool_pre_ping": settings.DATABASE_POOL_PRE_PING,
+        "connect_args": connect_args,
+        "query_cache_size": settings.DATABASE_COMPILED_CACHE_SIZE,
+    }
+
+
+def pool_stats(pool_engine) -> Optional[dict]:
+    # None without a client side pool (pooler mode)
+    return getattr(pool_engine.pool, "stats", None)
+
+
+# Session info key for a statement timeout set (SET LOCAL) as each transaction starts
+STATEMENT_TIMEOUT = "statement_timeout"
+# Session info key marking reads pinned to the primary (see get_read_db)
+PINNED_TO_PRIMARY = "pinned_to_primary"
+
+
+class TransactionSettingsSession(Session):
+    pass
+
+
+@event.listens_for(TransactionSettingsSession, "after_begin")
+def set_local_statement_timeout(session, transaction, connection):
+    statement_timeout = session.info.get(STATEMENT_TIMEOUT)
+    if statement_timeout:
+        connection.exec_driver_sql(
+            f"SET LOCAL statement_timeout = {int(statement_timeout)}"
+        )
+
+
+def make_session_maker(
+    bind, statement_timeout: int, pooler: bool = settings.DATABASE_POOLER_MODE
+) -> async_sessionmaker:
+    # Outside pooler mode connections already got the timeout when connecting
+    info = {STATEMENT_TIMEOUT: statement_timeout} if pooler else {}
+    return async_sessionmaker(
+        bind,
+        expire_on_commit=False,
+        sync_session_class=TransactionSettingsSession,
+        info=info,
+    )
+
+
+def sibling_session(db: AsyncSession) -> AsyncSession:
+    """
+    A new session on the same database and with the same statement timeout (and pin)
+    as `db`, for work that must not depend on (or outlive into) `db`'s request.
+    """
+    info = {
+        key: db.info[key]
+        for key in (STATEMENT_TIMEOUT, PINNED_TO_PRIMARY)
+        if key in db.info
+    }
+    return AsyncSession(
+        db.bind,
+        expire_on_commit=False,
+        sync_session_class=type(db.sync_session),
+        info=info,
+    )
+
+
+INTERACTIVE, BACKGROUND, BULK = "interactive", "background", "bulk"
+
+POOL_SIZES = {
+    INTERACTIVE: (settings.DATABASE_POOL_SIZE, settings.DATABASE_MAX_OVERFLOW),
+    BACKGROUND: (
+        settings.BACKGROUND_DATABASE_POOL_SIZE,
+        settings.BACKGROUND_DATABASE_MAX_OVERFLOW,
+    ),
+    BULK: (settings.BULK_DATABASE_POOL_SIZE, settings.BULK_DATABASE_MAX_OVERFLOW),
+}
+
+STATEMENT_TIMEOUTS = {
+    INTERACTIVE: settings.DATABASE_STATEMENT_TIMEOUT,
+    BACKGROUND: settings.BACKGROUND_DATABASE_STATEMENT_TIMEOUT,
+    BULK: settings.BULK_DATABASE_STATEMENT_TIMEOUT,
+}
+
+POOL_OPTIONS = {
+    name: pool_options(name, *POOL_SIZES[name], STATEMENT_TIMEOUTS[name])
+    for name in POOL_SIZES
+}
+
+engines = {
+    name: create_async_engine(settings.SQLALCHEMY_DATABASE_URL, **options)
+    for name, options in POOL_OPTIONS.items()
+}
+
+session_makers = {
+    name: make_session_maker(pool_engine, STATEMENT_TIMEOUTS[name])
+    for name, pool_engine in engines.items()
+}
+
+# Requests use the interactive pool
+engine = engines[INTERACTIVE]
+
+SessionLocal = session_makers[INTERACTIVE]
+
+# Replicas only serve reads, so their connections get the read timeout
+read_engines = [
+    create_async_engine(
+        url,
+        **pool_options(
+            INTERACTIVE, *POOL_SIZES[INTERACTIVE], settings.READ_STATEMENT_TIMEOUT
+        ),
+    )
+    for url in settings.SQLALCHEMY_READ_DATABASE_URLS
+]
+
+ReadSessionLocals = [
+    make_session_maker(read_engine, settings.READ_STATEMENT_TIMEOUT)
+    for read_engine in read_engines
+]
+
+# Set on clients that just wrote, reads go to the primary while it lives
+PRIMARY_PIN_COOKIE = "read_primary"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def get_session(pool: str = INTERACTIVE) -> AsyncSession:
+    """
+    Session on one of the named pools, for work outside requests.
+    e.g `async with get_session(BULK) as db: ...` in an export or seed script.
+    """
+    return session_makers[pool]()
 
 
 async def get_db():
@@ -16,3 +227,114 @@ async def get_db():
         yield db
     finally:
         await db.close()
+
+
+async def get_read_db(request: Request):
+    """
+    Session for read-only routes: a replica, or the primary for clients
+    that wrote within the last READ_YOUR_WRITES_WINDOW seconds.
+    Either way statements are bounded by READ_STATEMENT_TIMEOUT.
+    """
+    if ReadSessionLocals and not request.cookies.get(PRIMARY_PIN_COOKIE):
+        db = random.choice(ReadSessionLocals)()
+    else:
+        db = SessionLocal()
+        # Reads get a tighter timeout than the writes sharing the primary's pool
+        db.info[STATEMENT_TIMEOUT] = settings.READ_STATEMENT_TIMEOUT
+        if ReadSessionLocals:
+            # Caches may hold what a lagging replica returned, this client reads fresh
+            db.info[PINNED_TO_PRIMARY] = True
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+class ReadYourWritesMiddleware:
+    """
+    Pins clients to the primary after a successful write. The pin is a cookie
+    that expires with the window, so it holds whichever worker serves the next read.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        cookie = SimpleCookie()
+        cookie[PRIMARY_PIN_COOKIE] = "1"
+        cookie[PRIMARY_PIN_COOKIE]["max-age"] = settings.READ_YOUR_WRITES_WINDOW
+        cookie[PRIMARY_PIN_COOKIE]["path"] = "/"
+        cookie[PRIMARY_PIN_COOKIE]["httponly"] = True
+        if not settings.DEBUG:
+            # The frontend is on another site
+            cookie[PRIMARY_PIN_COOKIE]["samesite"] = "none"
+            cookie[PRIMARY_PIN_COOKIE]["secure"] = True
+        self.cookie = cookie.output(header="").strip()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] in SAFE_METHODS
+            or not ReadSessionLocals
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_pin(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                MutableHeaders(scope=message).append("set-cookie", self.cookie)
+            await send(message)
+
+        await self.app(scope, receive, send_with_pin)
+
+
+class CancelOnDisconnectMiddleware:
+    """
+    Cancels read requests once their client disconnects. psycopg cancels the
+    running query on the server when its task is cancelled, so an abandoned slow
+    read hands its connection back instead of running on. Writes are left to
+    finish, a unit of work is better committed or rolled back than cut off. Once the
+    response is sent, background tasks run on whatever the client does.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        # The app still gets every message, through this queue
+        messages = asyncio.Queue()
+        disconnected = responded = False
+
+        async def send_watched(message: Message) -> None:
+            nonlocal responded
+            if message["type"] == "http.response.body" and not message.get(
+                "more_body"
+            ):
+                # The client is served, the server reports a disconnect from now on
+                # while background tasks still run
+                responded = True
+            await send(message)
+
+        handler = asyncio.ensure_future(self.app(scope, messages.get, send_watched))
+
+        async def watch_disconnect() -> None:
+            nonlocal disconnected
+            while True:
+                message = await receive()
+                await messages.put(message)
+                if message["type"] == "http.disconnect":
+                    if not responded:
+                        disconnected = True
+                        handler.cancel()
+                    return
+
+        watcher = asyncio.ensure_future(watch_disconnect())
+        try:
+            await handler
+        except asyncio.CancelledError:
+            if not disconnected:
+                raise
+        finally:
+            watcher.cancel()
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Iterable, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
@@ -16,17 +16,19 @@ class UserManager(BaseManager[User]):
         ).scalar_one_or_none()
         return user
 
-    async def create(self, db: AsyncSession, obj_in) -> User:
+    async def create(self, db: AsyncSession, obj_in, load: Iterable[str] = ()) -> User:
         # hash the password
         obj_in.update({"password": get_password_hash(obj_in["password"])})
-        return await super().create(db, obj_in)
+        return await super().create(db, obj_in, load)
 
-    async def update(self, db: AsyncSession, db_obj: User, obj_in) -> Optional[User]:
+    async def update(
+        self, db: AsyncSession, db_obj: User, obj_in, load: Iterable[str] = ()
+    ) -> Optional[User]:
         # hash the password
         password = obj_in.get("password")
         if password:
             obj_in["password"] = get_password_hash(password)
-        user = await super().update(db, db_obj, obj_in)
+        user = await super().update(db, db_obj, obj_in, load)
         return user
 
 
@@ -37,13 +39,15 @@ class OtpManager(BaseManager[Otp]):
         ).scalar_one_or_none()
         return otp
 
-    async def create(self, db: AsyncSession, obj_in) -> Optional[Otp]:
+    async def create(
+        self, db: AsyncSession, obj_in, load: Iterable[str] = ()
+    ) -> Optional[Otp]:
         code = random.randint(100000, 999999)
         obj_in.update({"code": code})
         existing_otp = await self.get_by_user_id(db, obj_in["user_id"])
         if existing_otp:
-            return await self.update(db, existing_otp, {"code": code})
-        return await super().create(db, obj_in)
+            return await self.update(db, existing_otp, {"code": code}, load)
+        return await super().create(db, obj_in, load)
 
 
 class JwtManager(BaseManager[Jwt]):
@@ -1,16 +1,89 @@
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Generic, List, Optional, Type, TypeVar
+from decimal import Decimal
+from typing import AsyncIterator, Generic, Iterable, List, Optional, Type, TypeVar
 from uuid import UUID
 
-from sqlalchemy import select
-from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import (
+    Column,
+    Numeric,
+    Table,
+    column,
+    delete,
+    func,
+    inspect,
+    select,
+    table,
+    text,
+)
+from sqlalchemy.dialects.postgresql import Insert, insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
 
-from app.core.database import Base
+from app.common.cache import (
+    CACHE_INVALIDATION_CHANNEL,
+    invalidate_tables,
+    invalidation_payload,
+    is_cached,
+)
+from app.common.singleflight import single_flight
+from app.core.config import settings
+from app.core.database import Base, sibling_session
 from app.db.models.base import File, GuestUser
 
 ModelType = TypeVar("ModelType", bound=Base)
 
+# Session info key holding the tables written in the session's open unit of work
+UNIT_OF_WORK = "unit_of_work"
+
+# Bind parameters Postgres takes per statement
+MAX_BIND_PARAMS = 65535
+
+
+@asynccontextmanager
+async def unit_of_work(db: AsyncSession) -> AsyncIterator[AsyncSession]:
+    """
+    Runs every manager write in the block as one transaction. Managers only flush
+    inside it, it commits once on exit (or rolls back on error) and then evicts
+    caches built from the written tables. Nested blocks join the outer one.
+    """
+    if UNIT_OF_WORK in db.info:
+        yield db
+        return
+
+    tables = db.info[UNIT_OF_WORK] = set()
+    try:
+        yield db
+        await db.commit()
+    except BaseException:
+        await db.rollback()
+        raise
+    finally:
+        del db.info[UNIT_OF_WORK]
+    if tables:
+        invalidate_tables(*tables)
+
+
+def move_rows(table: Table, to_table: Table, where) -> Insert:
+    """
+    A single statement moving the rows of `table` matching `where` to `to_table`
+    (same columns): a DELETE ... RETURNING feeding an INSERT.
+    """
+    moved = delete(table).where(where).returning(*table.c).cte("moved")
+    names = [column.name for column in table.c]
+    return (
+        insert(to_table)
+        .from_select(names, select(*[moved.c[name] for name in names]))
+        .add_cte(moved)
+    )
+
+
+def default_value(column: Column):
+    # The value SQLAlchemy would insert for a column left out (python side defaults)
+    if column.default.is_callable:
+        return column.default.arg(None)
+    return column.default.arg
+
 
 class BaseManager(Generic[ModelType]):
     def __init__(self, model: Type[ModelType]):
@@ -21,6 +94,13 @@ class BaseManager(Generic[ModelType]):
         * `schema`: A Pydantic model (schema) class
         """
         self.model = model
+        # Written objects aren't reloaded, so numerics are rounded here like Postgres
+        # would
+        self.numeric_scales = {
+            column.key: column.type.scale
+            for column in model.__table__.columns
+            if isinstance(column.type, Numeric) and column.type.scale is not None
+        }
 
     async def get_all(self, db: AsyncSession) -> Optional[List[ModelType]]:
         result = (await db.execute(select(self.model))).scalars().all()
@@ -31,63 +111,259 @@ class BaseManager(Generic[ModelType]):
         # ids = [item[0] for item in items]
         return result
 
+    async def stream(
+        self,
+        db: AsyncSession,
+        *criteria,
+        yield_per: int = settings.DATABASE_STREAM_YIELD_PER,
+    ) -> AsyncIterator[ModelType]:
+        """
+        Iterates over the rows (matching `criteria`) through a server side cursor,
+        fetching `yield_per` at a time, so exports and batch jobs run in constant
+        memory however big the table. Rows come in pkid order, and aren't kept by
+        the session once the caller drops them.
+        e.g `async for bid in bid_manager.stream(db, Bid.listing_id == pkid): ...`
+        """
+        statement = (
+            select(self.model)
+            .where(*criteria)
+            .order_by(self.model.pkid)
+            .execution_options(yield_per=yield_per)
+        )
+        async for obj in await db.stream_scalars(statement):
+            yield obj
+
     async def get_by_id(self, db: AsyncSession, id: UUID) -> Optional[ModelType]:
         return (
             await db.execute(select(self.model).where(self.model.id == id))
         ).scalar_one_or_none()
 
+    async def get_coalesced(self, db: AsyncSession, method: str, *args):
+        """
+        Run a read method through the single-flight group, so concurrent identical
+        lookups (e.g hundreds of clients polling the same listing) share one query.
+        The query runs on its own session, closed once loaded, so it doesn't depend on
+        whichever request started it (cancelled or done meanwhile). Only use for
+        read-only routes, the returned objects are detached and shared between requests.
+        """
+
+        async def load():
+            async with sibling_session(db) as own_db:
+                return await getattr(self, method)(own_db, *args)
+
+        # Per database, a replica's (maybe lagging) result isn't the primary's
+        key = (db.bind, self.model.__tablename__, method, *args)
+        return await single_flight.do(key, load)
+
     async def create(
-        self, db: AsyncSession, obj_in: Optional[ModelType] = {}
+        self,
+        db: AsyncSession,
+        obj_in: Optional[ModelType] = {},
+        load: Iterable[str] = (),
     ) -> Optional[ModelType]:
         obj_in["created_at"] = datetime.utcnow()
         obj_in["updated_at"] = obj_in["created_at"]
-        obj = self.model(**obj_in)
+        obj = self.model(**self.as_stored(obj_in))
 
         db.add(obj)
-        await db.commit()
-        await db.refresh(obj)
+        await db.flush()
+        await self.notify_write(db, obj.id)
+        await self.commit(db)
+        await self.load_relationships(db, obj, load)
         return obj
 
-    async def bulk_create(self, db: AsyncSession, obj_in: list) -> Optional[bool]:
+    async def bulk_create(self, db: AsyncSession, obj_in: list) -> List[UUID]:
+        """
+        Inserts the rows (dicts with the same keys) skipping those conflicting with
+        existing ones, and returns the ids of the inserted ones. Batches from
+        settings.DATABASE_BULK_COPY_THRESHOLD rows are copied in (see copy_insert),
+        smaller ones go in INSERT ... VALUES chunks under the bind parameter limit.
+        """
+        if len(obj_in) >= settings.DATABASE_BULK_COPY_THRESHOLD:
+            insert_chunk = self.copy_insert
+            chunk_size = settings.DATABASE_BULK_COPY_CHUNK_SIZE
+        else:
+            insert_chunk = self.values_insert
+            # Left out columns with python side defaults take parameters too
+            chunk_size = MAX_BIND_PARAMS // len(self.model.__table__.columns)
+        ids = []
+        for start in range(0, len(obj_in), chunk_size):
+            ids += await insert_chunk(db, obj_in[start : start + chunk_size])
+        await self.notify_write(db)
+        await self.commit(db)
+        return ids
+
+    async def values_insert(self, db: AsyncSession, rows: list) -> List[UUID]:
         items = await db.execute(
             insert(self.model)
-            .values(obj_in)
+            .values(rows)
             .on_conflict_do_nothing()
             .returning(self.model.id)
         )
-        await db.commit()
+        return [item[0] for item in items]
+
+    async def copy_insert(self, db: AsyncSession, rows: list) -> List[UUID]:
+        """
+        Streams the rows with a binary COPY into a temporary staging table (no
+        constraints, no indexes, no bind parameters), then moves them over with an
+        INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING id. Both run in the
+        session's transaction, and the staging table is dropped right after (or with
+        the transaction, whatever happens in between).
+        """
+        target = self.model.__table__
+        names = list(rows[0])
+        defaulted = [
+            target_column
+            for target_column in target.columns
+            if target_column.key not in names
+            and target_column.default is not None
+            and (target_column.default.is_callable or target_column.default.is_scalar)
+        ]
+        column_names = names + [target_column.name for target_column in defaulted]
+        column_list = ", ".join(column_names)
+        staging = f"bulk_{target.name}"
+
+        await db.execute(
+            text(
+                f"CREATE TEMPORARY TABLE {staging} ON COMMIT DROP AS"
+                f" SELECT {column_list} FROM {target.name} LIMIT 0"
+            )
+        )
+        connection = await (await db.connection()).get_raw_connection()
+        async with connection.driver_connection.cursor() as cursor:
+            # Binary COPY needs the column types, the staging table's are the target's
+            await cursor.execute(f"SELECT {column_list} FROM {staging}")
+            types = [description.type_code for description in cursor.description]
+            async with cursor.copy(
+                f"COPY {staging} ({column_list}) FROM STDIN (FORMAT BINARY)"
+            ) as copy:
+                copy.set_types(types)
+                for row in rows:
+                    row = self.as_stored(dict(row))
+                    await copy.write_row(
+                        [row[name] for name in names]
+                        + [default_value(target_column) for target_column in defaulted]
+                    )
+
+        staged = table(staging, *[column(name) for name in column_names])
+        items = await db.execute(
+            insert(target)
+            .from_select(column_names, select(staged))
+            .on_conflict_do_nothing()
+            .returning(target.c.id)
+        )
         ids = [item[0] for item in items]
+        await db.execute(text(f"DROP TABLE {staging}"))
         return ids
 
     async def update(
-        self, db: AsyncSession, db_obj: Optional[ModelType], obj_in: Optional[ModelType]
+        self,
+        db: AsyncSession,
+        db_obj: Optional[ModelType],
+        obj_in: Optional[ModelType],
+        load: Iterable[str] = (),
     ) -> Optional[ModelType]:
         if not db_obj:
             return None
-        for attr, value in obj_in.items():
+        for attr, value in self.as_stored(obj_in).items():
             setattr(db_obj, attr, value)
         db_obj.updated_at = datetime.utcnow()
 
-        await db.commit()
-        await db.refresh(db_obj)
+        await self.notify_write(db, db_obj.id)
+        await self.commit(db)
+        await self.load_relationships(db, db_obj, load, changed=obj_in.keys())
         return db_obj
 
     async def delete(self, db: AsyncSession, db_obj: Optional[ModelType]):
         if db_obj:
             await db.delete(db_obj)
-            await db.commit()
+            await self.notify_write(db, db_obj.id)
+            await self.commit(db)
 
     async def delete_by_id(self, db: AsyncSession, id: UUID):
         to_delete = (
             await db.execute(select(self.model).where(self.model.id == id))
         ).scalar_one_or_none()
         await db.delete(to_delete)
-        await db.commit()
+        await self.notify_write(db, id)
+        await self.commit(db)
 
     async def delete_all(self, db: AsyncSession):
         to_delete = await db.delete(self.model)
         await db.execute(to_delete)
-        await db.commit()
+        await self.notify_write(db)
+        await self.commit(db)
+
+    def as_stored(self, obj_in: dict) -> dict:
+        for key, scale in self.numeric_scales.items():
+            if obj_in.get(key) is not None:
+                obj_in[key] = Decimal(str(obj_in[key])).quantize(Decimal(10) ** -scale)
+        return obj_in
+
+    async def load_relationships(
+        self,
+        db: AsyncSession,
+        obj: ModelType,
+        load: Iterable[str] = (),
+        changed: Iterable[str] = (),
+    ):
+        """
+        Written rows come back through RETURNING (see BaseModel), so instead of
+        refreshing the whole object this only fills the relationships in `load` (the
+        ones the caller goes on to read) that a write left unloaded (new objects) or
+        stale (changed foreign keys, always expired). Targets referenced by primary
+        key and already in the session, like the current user or a bid's listing,
+        are taken from its identity map, the others are loaded (in one SELECT).
+        """
+        relationships = inspect(self.model).relationships
+        stale = [
+            relationship.key
+            for relationship in relationships
+            if any(column.key in changed for column in relationship.local_columns)
+        ]
+        if stale:
+            db.expire(obj, stale)
+
+        unloaded = inspect(obj).unloaded
+        to_load = []
+        for key in load:
+            if key not in unloaded:
+                continue
+            relationship = relationships[key]
+            local, remote = relationship.local_remote_pairs[0]
+            value = getattr(obj, local.key)
+            target = None
+            if value is not None and remote.primary_key:
+                target = db.identity_map.get(
+                    relationship.mapper.identity_key_from_primary_key([value])
+                )
+            if value is None or target is not None:
+                set_committed_value(obj, key, target)
+            else:
+                to_load.append(key)
+        if to_load:
+            await db.refresh(obj, to_load)
+
+    async def commit(self, db: AsyncSession):
+        if UNIT_OF_WORK in db.info:
+            # Committed (and caches evicted) when the unit of work exits
+            await db.flush()
+            db.info[UNIT_OF_WORK].add(self.model.__tablename__)
+        else:
+            await db.commit()
+            self.invalidate_cache()
+
+    async def notify_write(self, db: AsyncSession, id: Optional[UUID] = None):
+        # Announce the write to other workers, NOTIFY is transactional so it's only
+        # delivered on commit
+        if not is_cached(self.model.__tablename__):
+            return
+        payload = invalidation_payload(self.model.__tablename__, id)
+        await db.execute(select(func.pg_notify(CACHE_INVALIDATION_CHANNEL, payload)))
+
+    def invalidate_cache(self):
+        # Evict cached payloads built from this table in this worker
+        invalidate_tables(self.model.__tablename__)
 
 
 class FileManager(BaseManager[File]):
@@ -1,16 +1,112 @@
-from typing import Optional, List, Any
-from sqlalchemy import or_, select
+from datetime import date, datetime
+from typing import Optional, Iterable, List, Any, Union
+from sqlalchemy import and_, case, delete, exists, func, or_, select, text, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.managers.base import BaseManager
-from app.db.models.listings import Category, Listing, WatchList, Bid
+from app.db.managers.base import BaseManager, ModelType, move_rows, unit_of_work
+from app.db.models.accounts import User
+from app.db.models.base import GuestUser
+from app.db.models.listings import (
+    Category,
+    Listing,
+    ListingArchive,
+    WatchList,
+    Bid,
+    BidArchive,
+    BidEvent,
+    watchlists_archive,
+)
 from app.api.utils.auth import Authentication
 
 from uuid import UUID
 from slugify import slugify
 
+# Fresh suffixes tried before giving up, each attempt is a single INSERT
+SLUG_ATTEMPTS = 5
 
-class CategoryManager(BaseManager[Category]):
+
+class SluggedManager(BaseManager[ModelType]):
+    """
+    Manager for models with a unique slug derived from their name. The slug is
+    picked inside the INSERT/UPDATE itself, the requested one when it's free or a
+    variant with a random suffix, so even a popular name costs a single statement.
+    """
+
+    # Archived rows keep their slugs (old links), so new rows can't take them
+    archive_model = None
+
+    def slug_choice(self, slug: str, suffix_base: str, own_id: Any = None):
+        taken = exists().where(self.model.slug == slug)
+        if own_id is not None:
+            taken = taken.where(self.model.id != own_id)
+        if self.archive_model is not None:
+            taken = or_(taken, exists().where(self.archive_model.slug == slug))
+        random_str = Authentication.get_random(4)
+        return case((taken, f"{suffix_base}-{random_str}"), else_=slug)
+
+    async def create(
+        self, db: AsyncSession, obj_in, load: Iterable[str] = ()
+    ) -> Optional[ModelType]:
+        created_slug = slugify(obj_in["name"])
+        slug = obj_in.get("slug") or created_slug
+        obj_in["created_at"] = datetime.utcnow()
+        obj_in["updated_at"] = obj_in["created_at"]
+        values = self.as_stored(obj_in)
+        self.model(**values)  # Runs the model's validators, the row is inserted below
+
+        # A slug taken between the check and the insert (a race, or a clashing
+        # suffix) skips the row instead of failing, and is retried with a new suffix
+        for _ in range(SLUG_ATTEMPTS):
+            values["slug"] = self.slug_choice(slug, created_slug)
+            obj = (
+                await db.execute(
+                    insert(self.model)
+                    .values(**values)
+                    .on_conflict_do_nothing(index_elements=[self.model.slug])
+                    .returning(self.model)
+                )
+            ).scalar_one_or_none()
+            if obj:
+                break
+        else:
+            raise ValueError(f"Couldn't allocate a unique slug for '{slug}'")
+
+        await self.notify_write(db, obj.id)
+        await self.commit(db)
+        await self.load_relationships(db, obj, load)
+        return obj
+
+    async def update(
+        self, db: AsyncSession, db_obj: ModelType, obj_in, load: Iterable[str] = ()
+    ) -> ModelType:
+        name = obj_in.get("name")
+        if not db_obj or not name or name == db_obj.name:
+            return await super().update(db, db_obj, obj_in, load)
+
+        created_slug = slugify(name)
+        slug = obj_in.get("slug") or created_slug
+        values = self.as_stored(obj_in)
+        values["slug"] = self.slug_choice(slug, created_slug, own_id=db_obj.id)
+        values["updated_at"] = datetime.utcnow()
+        # The returned row refreshes db_obj, slug included. No ON CONFLICT for
+        # updates, a concurrent rename to the same slug fails on the unique index
+        db_obj = (
+            await db.execute(
+                update(self.model)
+                .where(self.model.id == db_obj.id)
+                .values(**values)
+                .returning(self.model)
+            )
+        ).scalar_one()
+
+        await self.notify_write(db, db_obj.id)
+        await self.commit(db)
+        await self.load_relationships(db, db_obj, load, changed=obj_in.keys())
+        return db_obj
+
+
+class CategoryManager(SluggedManager[Category]):
     async def get_by_name(self, db: AsyncSession, name: str) -> Optional[Category]:
         category = (
             await db.execute(select(self.model).where(self.model.name == name))
@@ -23,23 +119,10 @@ class CategoryManager(BaseManager[Category]):
         ).scalar_one_or_none()
         return category
 
-    async def create(self, db: AsyncSession, obj_in) -> Optional[Category]:
-        # Generate unique slug
-        created_slug = slugify(obj_in["name"])
-        updated_slug = obj_in.get("slug")
-        slug = updated_slug if updated_slug else created_slug
-
-        obj_in["slug"] = slug
-        slug_exists = await self.get_by_slug(db, slug)
-        if slug_exists:
-            random_str = Authentication.get_random(4)
-            obj_in["slug"] = f"{created_slug}-{random_str}"
-            return await self.create(db, obj_in)
-
-        return await super().create(db, obj_in)
 
+class ListingManager(SluggedManager[Listing]):
+    archive_model = ListingArchive
 
-class ListingManager(BaseManager[Listing]):
     async def get_all(self, db: AsyncSession) -> Optional[List[Listing]]:
         return (
             (
@@ -66,10 +149,22 @@ class ListingManager(BaseManager[Listing]):
             .all()
         )
 
-    async def get_by_slug(self, db: AsyncSession, slug: str) -> Optional[Listing]:
+    async def get_by_slug(
+        self, db: AsyncSession, slug: str, archived: bool = False
+    ) -> Optional[Union[Listing, ListingArchive]]:
+        """
+        With `archived`, falls back to the archive for closed listings (old links).
+        Only for reads, archived listings can't be bid on or watched.
+        """
         listing = (
             await db.execute(select(self.model).where(self.model.slug == slug))
         ).scalar_one_or_none()
+        if not listing and archived:
+            listing = (
+                await db.execute(
+                    select(ListingArchive).where(ListingArchive.slug == slug)
+                )
+            ).scalar_one_or_none()
         return listing
 
     async def get_related_listings(
@@ -109,41 +204,71 @@ class ListingManager(BaseManager[Listing]):
         )
         return listings
 
-    async def create(self, db: AsyncSession, obj_in) -> Optional[Listing]:
-        # Generate unique slug
-
-        created_slug = slugify(obj_in["name"])
-        updated_slug = obj_in.get("slug")
-        slug = updated_slug if updated_slug else created_slug
-        obj_in["slug"] = slug
-        slug_exists = await self.get_by_slug(db, slug)
-        if slug_exists:
-            random_str = Authentication.get_random(4)
-            obj_in["slug"] = f"{created_slug}-{random_str}"
-            return await self.create(db, obj_in)
-
-        return await super().create(db, obj_in)
-
-    async def update(self, db: AsyncSession, db_obj: Listing, obj_in) -> Listing:
-        name = obj_in.get("name")
-        if name and name != db_obj.name:
-            # Generate unique slug
-            created_slug = slugify(name)
-            updated_slug = obj_in.get("slug")
-            slug = updated_slug if updated_slug else created_slug
-            obj_in["slug"] = slug
-            slug_exists = await self.get_by_slug(db, slug)
-            if slug_exists and not slug == db_obj.slug:
-                random_str = Authentication.get_random(4)
-                obj_in["slug"] = f"{created_slug}-{random_str}"
-                return await self.update(db, db_obj, obj_in)
+    async def archive_closed(
+        self, db: AsyncSession, closed_before: datetime, batch_size: int
+    ) -> int:
+        """
+        Moves the listings closed before `closed_before` (past their closing date,
+        or deactivated) to the archive, along with their bids and watchlists.
+        Each batch is its own short transaction, listings being bid on or edited
+        meanwhile are skipped until the next run. Returns the number moved.
+        """
+        closed = or_(
+            self.model.closing_date < closed_before,
+            and_(self.model.active.is_(False), self.model.updated_at < closed_before),
+        )
+        moved = 0
+        while True:
+            async with unit_of_work(db):
+                pkids = (
+                    (
+                        await db.execute(
+                            select(self.model.pkid)
+                            .where(closed)
+                            .order_by(self.model.pkid)
+                            .limit(batch_size)
+                            .with_for_update(skip_locked=True)
+                        )
+                    )
+                    .scalars()
+                    .all()
+                )
+                if not pkids:
+                    return moved
 
-        return await super().update(db, db_obj, obj_in)
+                # The listings are copied first, the archived children reference them
+                listings = self.model.__table__
+                listed = listings.c.pkid.in_(pkids)
+                await db.execute(
+                    insert(ListingArchive.__table__).from_select(
+                        [column.name for column in listings.c],
+                        select(listings).where(listed),
+                    )
+                )
+                moves = (
+                    (bid_manager, BidArchive.__table__, Bid.listing_id),
+                    (watchlist_manager, watchlists_archive, WatchList.listing_id),
+                )
+                for manager, archive, listing_key in moves:
+                    table = manager.model.__table__
+                    await db.execute(move_rows(table, archive, listing_key.in_(pkids)))
+                    await manager.notify_write(db)
+                    await manager.commit(db)
+                await db.execute(delete(listings).where(listed))
+                await self.notify_write(db)
+                await self.commit(db)
+            moved += len(pkids)
 
 
 class WatchListManager(BaseManager[WatchList]):
+    def client_filter(self, client: Union[User, GuestUser]):
+        # Users and guests have their own pkid sequences, match the client's column
+        if isinstance(client, User):
+            return self.model.user_id == client.pkid
+        return self.model.session_key == client.pkid
+
     async def get_by_user_id(
-        self, db: AsyncSession, user_id: UUID
+        self, db: AsyncSession, user_id: int
     ) -> Optional[List[WatchList]]:
         watchlist = (
             (
@@ -159,7 +284,7 @@ class WatchListManager(BaseManager[WatchList]):
         return watchlist
 
     async def get_by_session_key(
-        self, db: AsyncSession, session_key: UUID, user_id: UUID
+        self, db: AsyncSession, session_key: Optional[int], user_id: int
     ) -> Optional[List[WatchList]]:
         subquery = select(self.model.listing_id).where(self.model.user_id == user_id)
         watchlist = (
@@ -176,21 +301,16 @@ class WatchListManager(BaseManager[WatchList]):
         )
         return watchlist
 
-    async def get_by_client_id(
-        self, db: AsyncSession, client_id: Optional[UUID]
+    async def get_by_client(
+        self, db: AsyncSession, client: Optional[Union[User, GuestUser]]
     ) -> Optional[List[WatchList]]:
-        if not client_id:
+        if not client:
             return []
         watchlist = (
             (
                 await db.execute(
                     select(self.model)
-                    .where(
-                        or_(
-                            self.model.user_id == client_id,
-                            self.model.session_key == client_id,
-                        )
-                    )
+                    .where(self.client_filter(client))
                     .order_by(self.model.created_at.desc())
                 )
             )
@@ -199,21 +319,38 @@ class WatchListManager(BaseManager[WatchList]):
         )
         return watchlist
 
-    async def get_by_client_id_and_listing_id(
-        self, db: AsyncSession, client_id: Optional[UUID], listing_id: UUID
+    async def get_listing_ids_by_client(
+        self, db: AsyncSession, client: Optional[Union[User, GuestUser]]
+    ) -> set:
+        """
+        The pkids of the listings in the client's watchlist
+        """
+        if not client:
+            return set()
+        listing_ids = (
+            (
+                await db.execute(
+                    select(self.model.listing_id).where(self.client_filter(client))
+                )
+            )
+            .scalars()
+            .all()
+        )
+        return set(listing_ids)
+
+    async def get_by_client_and_listing_id(
+        self,
+        db: AsyncSession,
+        client: Optional[Union[User, GuestUser]],
+        listing_id: int,
     ) -> Optional[List[WatchList]]:
-        if not client_id:
+        if not client:
             return None
 
         watchlist = (
             await db.execute(
                 select(self.model)
-                .where(
-                    or_(
-                        self.model.user_id == client_id,
-                        self.model.session_key == client_id,
-                    )
-                )
+                .where(self.client_filter(client))
                 .where(self.model.listing_id == listing_id)
             )
         ).scalar_one_or_none()
@@ -223,12 +360,20 @@ class WatchListManager(BaseManager[WatchList]):
         user_id = obj_in.get("user_id")
         session_key = obj_in.get("session_key")
         listing_id = obj_in["listing_id"]
-        key = user_id if user_id else session_key
 
         # Avoid duplicates
-        existing_watchlist = await watchlist_manager.get_by_client_id_and_listing_id(
-            db, key, listing_id
+        key_filter = (
+            self.model.user_id == user_id
+            if user_id
+            else self.model.session_key == session_key
         )
+        existing_watchlist = (
+            await db.execute(
+                select(self.model)
+                .where(key_filter)
+                .where(self.model.listing_id == listing_id)
+            )
+        ).scalar_one_or_none()
         if existing_watchlist:
             return existing_watchlist
         return await super().create(db, obj_in)
@@ -236,7 +381,7 @@ class WatchListManager(BaseManager[WatchList]):
 
 class BidManager(BaseManager[Bid]):
     async def get_by_user_id(
-        self, db: AsyncSession, user_id: UUID
+        self, db: AsyncSession, user_id: int
     ) -> Optional[List[Bid]]:
         bids = (
             (
@@ -252,14 +397,16 @@ class BidManager(BaseManager[Bid]):
         return bids
 
     async def get_by_listing_id(
-        self, db: AsyncSession, listing_id: UUID
-    ) -> Optional[List[Bid]]:
+        self, db: AsyncSession, listing_id: int, archived: bool = False
+    ) -> Optional[List[Union[Bid, BidArchive]]]:
+        # The bids of an archived listing are archived with it
+        model = BidArchive if archived else self.model
         bids = (
             (
                 await db.execute(
-                    select(self.model)
-                    .where(self.model.listing_id == listing_id)
-                    .order_by(self.model.updated_at.desc())
+                    select(model)
+                    .where(model.listing_id == listing_id)
+                    .order_by(model.updated_at.desc())
                 )
             )
             .scalars()
@@ -268,7 +415,7 @@ class BidManager(BaseManager[Bid]):
         return bids
 
     async def get_by_user_and_listing_id(
-        self, db: AsyncSession, user_id: UUID, listing_id: UUID
+        self, db: AsyncSession, user_id: int, listing_id: int
     ) -> Optional[Bid]:
         bid = (
             await db.execute(
@@ -279,7 +426,7 @@ class BidManager(BaseManager[Bid]):
         ).scalar_one_or_none()
         return bid
 
-    async def create(self, db: AsyncSession, obj_in: dict):
+    async def create(self, db: AsyncSession, obj_in: dict, load: Iterable[str] = ()):
         user_id = obj_in["user_id"]
         listing_id = obj_in["listing_id"]
 
@@ -289,17 +436,145 @@ class BidManager(BaseManager[Bid]):
         if existing_bid:
             obj_in.pop("user_id", None)
             obj_in.pop("listing_id", None)
-            return await self.update(db, existing_bid, obj_in)
+            return await self.update(db, existing_bid, obj_in, load)
 
-        new_bid = await super().create(db, obj_in)
+        await bid_event_manager.append(db, user_id, listing_id, obj_in["amount"])
+        new_bid = await super().create(db, obj_in, load)
         return new_bid
 
+    async def update(
+        self,
+        db: AsyncSession,
+        db_obj: Optional[Bid],
+        obj_in: dict,
+        load: Iterable[str] = (),
+    ):
+        # Every new amount is kept in the history, the bid itself only has the latest
+        if db_obj and "amount" in obj_in:
+            await bid_event_manager.append(
+                db, db_obj.user_id, db_obj.listing_id, obj_in["amount"]
+            )
+        return await super().update(db, db_obj, obj_in, load)
+
+
+def month_start(day: date, months: int = 0) -> date:
+    month = day.year * 12 + day.month - 1 + months
+    return date(month // 12, month % 12 + 1, 1)
+
+
+class BidEventManager(BaseManager[BidEvent]):
+    async def append(
+        self, db: AsyncSession, user_id: int, listing_id: int, amount: Any
+    ) -> None:
+        # A plain INSERT, events are never read back or changed by the writer
+        await db.execute(
+            insert(self.model).values(
+                **self.as_stored(
+                    {
+                        "user_id": user_id,
+                        "listing_id": listing_id,
+                        "amount": amount,
+                        "created_at": datetime.utcnow(),
+                    }
+                )
+            )
+        )
+
+    async def get_by_listing_id(
+        self, db: AsyncSession, listing_id: int
+    ) -> Optional[List[BidEvent]]:
+        return (
+            (
+                await db.execute(
+                    select(self.model)
+                    .where(self.model.listing_id == listing_id)
+                    .order_by(self.model.created_at.desc())
+                )
+            )
+            .scalars()
+            .all()
+        )
+
+    def partition_name(self, month: date) -> str:
+        return f"{self.model.__tablename__}_{month:%Y_%m}"
+
+    async def create_partitions(
+        self, db: AsyncSession, months_ahead: int, today: Optional[date] = None
+    ) -> List[str]:
+        """
+        Creates the monthly partitions from this month to `months_ahead` months
+        later, if missing. Returns the names of the ones created.
+        """
+        table = self.model.__tablename__
+        # Workers starting together would race on the same partitions
+        await db.execute(select(func.pg_advisory_xact_lock(func.hashtext(table))))
+        existing = set(await self.get_partitions(db))
+        created = []
+        for months in range(months_ahead + 1):
+            start = month_start(today or datetime.utcnow().date(), months)
+            name = self.partition_name(start)
+            if name in existing:
+                continue
+            await db.execute(
+                text(
+                    f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES"
+                    f" FROM ('{start}') TO ('{month_start(start, 1)}')"
+                )
+            )
+            created.append(name)
+        await db.commit()
+        return created
+
+    async def detach_partitions(self, db: AsyncSession, before: date) -> List[str]:
+        """
+        Detaches the monthly partitions of months before `before`. They're left as
+        plain tables to archive (pg_dump) and drop, the live table never scans them
+        again. Returns their names.
+        """
+        table = self.model.__tablename__
+        oldest_kept = self.partition_name(month_start(before))
+        detached = []
+        for name in await self.get_partitions(db):
+            # Monthly names sort by month, the default partition is never detached
+            if name.endswith("_default") or name >= oldest_kept:
+                continue
+            await db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+            detached.append(name)
+        await db.commit()
+        return detached
+
+    async def count_unpartitioned(self, db: AsyncSession) -> int:
+        """
+        Events that fell in the default partition, for months missing a partition.
+        While it holds rows of a month, that month's partition can't be created.
+        """
+        table = f"{self.model.__tablename__}_default"
+        return (await db.execute(text(f"SELECT count(*) FROM {table}"))).scalar()
+
+    async def get_partitions(self, db: AsyncSession) -> List[str]:
+        return (
+            (
+                await db.execute(
+                    text(
+                        "SELECT child.relname FROM pg_inherits"
+                        " JOIN pg_class child ON child.oid = pg_inherits.inhrelid"
+                        " WHERE pg_inherits.inhparent = CAST(:table AS regclass)"
+                        " ORDER BY child.relname"
+                    ),
+                    {"table": self.model.__tablename__},
+                )
+            )
+            .scalars()
+            .all()
+        )
+
 
 # How to use
 category_manager = CategoryManager(Category)
 listing_manager = ListingManager(Listing)
 watchlist_manager = WatchListManager(WatchList)
 bid_manager = BidManager(Bid)
+bid_event_manager = BidEventManager(BidEvent)
 
 
 # this can now be used to perform any available crud actions e.g category_manager.get_by_id(db=db, id=id)
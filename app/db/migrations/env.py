@@ -2,9 +2,12 @@ import asyncio
 from logging.config import fileConfig
 
 from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
 
 from alembic import context
-from app.core.database import Base, engine
+from app.core.config import settings
+from app.core.database import BULK, Base, engines
 from app.db.models.general import *
 from app.db.models.accounts import *
 from app.db.models.listings import *
@@ -55,14 +58,27 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    # Migrations own their transactions (one each), so a migration can step out of
+    # them with autocommit_block, e.g to build indexes concurrently
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        transaction_per_migration=True,
+    )
 
     with context.begin_transaction():
         context.run_migrations()
 
 
 async def run_async_migrations() -> None:
-    async with engine.begin() as connection:
+    # No statement timeout, index builds can take a while
+    connectable = engines[BULK]
+    # A url given by the caller (e.g tests) or the direct one. Migrations span several
+    # transactions on one session, so they bypass any pooler
+    url = config.attributes.get("url") or settings.SQLALCHEMY_DIRECT_DATABASE_URL
+    if url:
+        connectable = create_async_engine(url, poolclass=NullPool)
+    async with connectable.connect() as connection:
         await connection.run_sync(do_run_migrations)
 
 
@@ -0,0 +1,67 @@
+"""Hot query indexes
+
+Revision ID: a3c1f0e7b9d2
+Revises: 59821156b57d
+Create Date: 2026-10-19 10:12:41.218309
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a3c1f0e7b9d2"
+down_revision = "59821156b57d"
+branch_labels = None
+depends_on = None
+
+# name, table, columns, extra kwargs
+INDEXES = [
+    ("ix_listings_created_at", "listings", ["created_at"], {}),
+    (
+        "ix_listings_auctioneer_id_created_at",
+        "listings",
+        ["auctioneer_id", "created_at"],
+        {},
+    ),
+    (
+        "ix_listings_category_id_created_at",
+        "listings",
+        ["category_id", "created_at"],
+        {},
+    ),
+    ("ix_bids_listing_id_updated_at", "bids", ["listing_id", "updated_at"], {}),
+    ("ix_bids_user_id_updated_at", "bids", ["user_id", "updated_at"], {}),
+    ("ix_watchlists_user_id_created_at", "watchlists", ["user_id", "created_at"], {}),
+    (
+        "ix_watchlists_session_key_created_at",
+        "watchlists",
+        ["session_key", "created_at"],
+        {},
+    ),
+    ("ix_jwts_refresh", "jwts", ["refresh"], {}),
+    (
+        "ix_reviews_shown",
+        "reviews",
+        ["created_at"],
+        {"postgresql_where": sa.text("show")},
+    ),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY can't run in a transaction, but doesn't lock the tables against
+    # writes
+    with op.get_context().autocommit_block():
+        for name, table, columns, kwargs in INDEXES:
+            # A failed concurrent build leaves an invalid index behind
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+            op.create_index(
+                name, table, columns, postgresql_concurrently=True, **kwargs
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,87 @@
+"""Integer bid and watchlist foreign keys
+
+Revision ID: c7d2e9a4f1b3
+Revises: a3c1f0e7b9d2
+Create Date: 2026-10-19 15:40:12.604118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c7d2e9a4f1b3"
+down_revision = "a3c1f0e7b9d2"
+branch_labels = None
+depends_on = None
+
+# table, column, referenced table
+FOREIGN_KEYS = [
+    ("bids", "user_id", "users"),
+    ("bids", "listing_id", "listings"),
+    ("watchlists", "user_id", "users"),
+    ("watchlists", "listing_id", "listings"),
+    ("watchlists", "session_key", "guestusers"),
+]
+
+# Constraints and indexes on the swapped columns, dropped along with the old ones
+UNIQUE_CONSTRAINTS = [
+    ("unique_listing_amount_bids", "bids", ["listing_id", "amount"]),
+    ("unique_user_listing_bids", "bids", ["user_id", "listing_id"]),
+    ("unique_user_listing_watchlists", "watchlists", ["user_id", "listing_id"]),
+    (
+        "unique_session_key_listing_watchlists",
+        "watchlists",
+        ["session_key", "listing_id"],
+    ),
+]
+INDEXES = [
+    ("ix_bids_listing_id_updated_at", "bids", ["listing_id", "updated_at"]),
+    ("ix_bids_user_id_updated_at", "bids", ["user_id", "updated_at"]),
+    ("ix_watchlists_user_id_created_at", "watchlists", ["user_id", "created_at"]),
+    (
+        "ix_watchlists_session_key_created_at",
+        "watchlists",
+        ["session_key", "created_at"],
+    ),
+]
+
+
+def swap_foreign_keys(column_type, from_key: str, to_key: str) -> None:
+    """
+    Rewrites each foreign key to reference `to_key` of its table instead of
+    `from_key`: a new column is added and filled from the referenced rows, then
+    replaces the old one, and the constraints and indexes on it are rebuilt.
+    The tables are locked meanwhile, so run it in a quiet window on big ones.
+    """
+    for table, column, referenced in FOREIGN_KEYS:
+        op.add_column(table, sa.Column(f"new_{column}", column_type, nullable=True))
+        op.execute(
+            f"UPDATE {table} SET new_{column} = {referenced}.{to_key}"
+            f" FROM {referenced} WHERE {referenced}.{from_key} = {table}.{column}"
+        )
+
+    # Dropping the old columns drops their foreign keys, constraints and indexes
+    for table, column, referenced in FOREIGN_KEYS:
+        op.drop_column(table, column)
+        op.alter_column(table, f"new_{column}", new_column_name=column)
+        op.create_foreign_key(
+            f"{table}_{column}_fkey",
+            table,
+            referenced,
+            [column],
+            [to_key],
+            ondelete="CASCADE",
+        )
+    for name, table, columns in UNIQUE_CONSTRAINTS:
+        op.create_unique_constraint(name, table, columns)
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def upgrade() -> None:
+    swap_foreign_keys(sa.Integer(), from_key="id", to_key="pkid")
+
+
+def downgrade() -> None:
+    swap_foreign_keys(sa.UUID(), from_key="pkid", to_key="id")
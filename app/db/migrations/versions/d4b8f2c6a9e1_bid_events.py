@@ -0,0 +1,75 @@
+"""Bid events
+
+Revision ID: d4b8f2c6a9e1
+Revises: c7d2e9a4f1b3
+Create Date: 2026-10-19 17:05:48.311902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d4b8f2c6a9e1"
+down_revision = "c7d2e9a4f1b3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Later months are created ahead by the app, see BidEventManager.create_partitions
+    op.create_table(
+        "bid_events",
+        sa.Column("pkid", sa.BigInteger(), sa.Identity(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("listing_id", sa.Integer(), nullable=True),
+        sa.Column("amount", sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.ForeignKeyConstraint(["listing_id"], ["listings.pkid"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["user_id"], ["users.pkid"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("pkid", "created_at"),
+        postgresql_partition_by="RANGE (created_at)",
+    )
+    op.create_index(
+        "ix_bid_events_listing_id_created_at",
+        "bid_events",
+        ["listing_id", "created_at"],
+    )
+    op.execute("CREATE TABLE bid_events_default PARTITION OF bid_events DEFAULT")
+
+    # Start the history with the current bids, in monthly partitions from the
+    # oldest one on (a month with rows in the default one can't be created later)
+    op.execute(
+        """
+        DO $$
+        DECLARE
+            since timestamp := (SELECT min(coalesce(updated_at, created_at)) FROM bids);
+            month date;
+        BEGIN
+            FOR month IN SELECT generate_series(
+                date_trunc('month', coalesce(since, now())),
+                date_trunc('month', now()) + interval '2 months',
+                interval '1 month'
+            )::date LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF bid_events'
+                    ' FOR VALUES FROM (%L) TO (%L)',
+                    'bid_events_' || to_char(month, 'YYYY_MM'),
+                    month,
+                    month + interval '1 month'
+                );
+            END LOOP;
+        END $$
+        """
+    )
+    op.execute(
+        "INSERT INTO bid_events (created_at, user_id, listing_id, amount)"
+        " SELECT coalesce(updated_at, created_at, now()), user_id, listing_id, amount"
+        " FROM bids"
+    )
+
+
+def downgrade() -> None:
+    # Partitions go with their parent
+    op.drop_index("ix_bid_events_listing_id_created_at", table_name="bid_events")
+    op.drop_table("bid_events")
@@ -0,0 +1,101 @@
+"""Archive tables
+
+Revision ID: e1f5a3b7c9d2
+Revises: d4b8f2c6a9e1
+Create Date: 2026-10-19 18:22:03.957410
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e1f5a3b7c9d2"
+down_revision = "d4b8f2c6a9e1"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "listings_archive",
+        sa.Column("auctioneer_id", sa.UUID(), nullable=True),
+        sa.Column("name", sa.String(length=70), nullable=True),
+        sa.Column("slug", sa.String(), nullable=True),
+        sa.Column("desc", sa.Text(), nullable=True),
+        sa.Column("category_id", sa.UUID(), nullable=True),
+        sa.Column("price", sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column("highest_bid", sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column("bids_count", sa.Integer(), nullable=True),
+        sa.Column("closing_date", sa.DateTime(), nullable=True),
+        sa.Column("active", sa.Boolean(), nullable=True),
+        sa.Column("image_id", sa.UUID(), nullable=True),
+        sa.Column("pkid", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("id", sa.UUID(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["auctioneer_id"], ["users.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(
+            ["category_id"], ["categories.id"], ondelete="SET NULL"
+        ),
+        sa.ForeignKeyConstraint(["image_id"], ["files.id"], ondelete="SET NULL"),
+        sa.PrimaryKeyConstraint("pkid"),
+        sa.UniqueConstraint("id"),
+        sa.UniqueConstraint("image_id"),
+        sa.UniqueConstraint("slug"),
+    )
+    op.create_table(
+        "bids_archive",
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("listing_id", sa.Integer(), nullable=True),
+        sa.Column("amount", sa.Numeric(precision=10, scale=2), nullable=True),
+        sa.Column("pkid", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("id", sa.UUID(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["listing_id"], ["listings_archive.pkid"], ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(["user_id"], ["users.pkid"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("pkid"),
+        sa.UniqueConstraint("id"),
+    )
+    op.create_index("ix_bids_archive_listing_id", "bids_archive", ["listing_id"])
+    op.create_table(
+        "watchlists_archive",
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("listing_id", sa.Integer(), nullable=True),
+        sa.Column("session_key", sa.Integer(), nullable=True),
+        sa.Column("pkid", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("id", sa.UUID(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["listing_id"], ["listings_archive.pkid"], ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(
+            ["session_key"], ["guestusers.pkid"], ondelete="CASCADE"
+        ),
+        sa.ForeignKeyConstraint(["user_id"], ["users.pkid"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("pkid"),
+        sa.UniqueConstraint("id"),
+    )
+
+    # Bid history outlives listings moved to the archive
+    op.drop_constraint("bid_events_listing_id_fkey", "bid_events", type_="foreignkey")
+
+
+def downgrade() -> None:
+    # Fails while bid history references archived listings, restore them first
+    op.create_foreign_key(
+        "bid_events_listing_id_fkey",
+        "bid_events",
+        "listings",
+        ["listing_id"],
+        ["pkid"],
+        ondelete="CASCADE",
+    )
+    op.drop_table("watchlists_archive")
+    op.drop_index("ix_bids_archive_listing_id", table_name="bids_archive")
+    op.drop_table("bids_archive")
+    op.drop_table("listings_archive")
@@ -52,7 +52,7 @@ class Jwt(BaseModel):
     )
     user: Mapped[User] = relationship("User", lazy="joined")
     access: Mapped[str] = Column(String())
-    refresh: Mapped[str] = Column(String())
+    refresh: Mapped[str] = Column(String(), index=True)
 
     def __repr__(self):
         return f"Access - {self.access} | Refresh - {self.refresh}"
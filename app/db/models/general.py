@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, String
+from sqlalchemy import Boolean, Column, ForeignKey, Index, String
 from sqlalchemy.orm import Mapped, relationship
 
 from sqlalchemy.dialects.postgresql import UUID
@@ -50,3 +50,8 @@ class Review(BaseModel):
 
     def __repr__(self):
         return str(self.reviewer_id)
+
+    __table_args__ = (
+        # Only shown reviews are ever queried
+        Index("ix_reviews_shown", "created_at", postgresql_where=show),
+    )
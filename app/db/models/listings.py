@@ -1,14 +1,19 @@
 from sqlalchemy import (
+    DDL,
+    BigInteger,
     Boolean,
     Column,
     DateTime,
     ForeignKey,
+    Identity,
     Integer,
     String,
     Text,
     Numeric,
     UniqueConstraint,
+    Index,
 )
+from sqlalchemy import event
 from sqlalchemy.orm import Mapped, relationship, validates
 
 from sqlalchemy.dialects.postgresql import UUID
@@ -16,7 +21,9 @@ from uuid import UUID as GUUID  # General UUID
 
 from app.db.models.accounts import User
 
-from .base import BaseModel, File
+from app.core.database import Base
+
+from .base import BaseModel, File, archive_table
 from datetime import datetime
 
 
@@ -83,17 +90,23 @@ class Listing(BaseModel):
             return 0
         return self.time_left_seconds
 
+    __table_args__ = (
+        Index("ix_listings_created_at", "created_at"),
+        Index("ix_listings_auctioneer_id_created_at", "auctioneer_id", "created_at"),
+        Index("ix_listings_category_id_created_at", "category_id", "created_at"),
+    )
 
+
+# Bids and watchlists reference the 4 byte pkid of their users/listings/guests
+# (narrow FK indexes and joins), the UUID ids stay the API's identifiers
 class Bid(BaseModel):
     __tablename__ = "bids"
 
-    user_id: Mapped[GUUID] = Column(
-        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE")
-    )
+    user_id: Mapped[int] = Column(Integer, ForeignKey("users.pkid", ondelete="CASCADE"))
     user: Mapped[User] = relationship("User", lazy="joined")
 
-    listing_id: Mapped[GUUID] = Column(
-        UUID(as_uuid=True), ForeignKey("listings.id", ondelete="CASCADE")
+    listing_id: Mapped[int] = Column(
+        Integer, ForeignKey("listings.pkid", ondelete="CASCADE")
     )
     amount: Mapped[float] = Column(Numeric(precision=10, scale=2))
 
@@ -103,24 +116,56 @@ class Bid(BaseModel):
     __table_args__ = (
         UniqueConstraint("listing_id", "amount", name="unique_listing_amount_bids"),
         UniqueConstraint("user_id", "listing_id", name="unique_user_listing_bids"),
+        Index("ix_bids_listing_id_updated_at", "listing_id", "updated_at"),
+        Index("ix_bids_user_id_updated_at", "user_id", "updated_at"),
     )
 
 
+class BidEvent(Base):
+    """
+    Append-only history of every bid placed. Bids keeps each user's latest bid on a
+    listing, the small summary listing pages read, while this only grows. It's range
+    partitioned by month on created_at, so inserts only touch the current month's
+    indexes and old months are detached whole (see BidEventManager).
+    """
+
+    __tablename__ = "bid_events"
+
+    # Unique constraints of partitioned tables must include the partition key
+    pkid: Mapped[int] = Column(BigInteger, Identity(), primary_key=True)
+    created_at: Mapped[datetime] = Column(DateTime, primary_key=True)
+    user_id: Mapped[int] = Column(Integer, ForeignKey("users.pkid", ondelete="CASCADE"))
+    # No foreign key, the history outlives listings moved to the archive
+    listing_id: Mapped[int] = Column(Integer)
+    amount: Mapped[float] = Column(Numeric(precision=10, scale=2))
+
+    __table_args__ = (
+        Index("ix_bid_events_listing_id_created_at", "listing_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+
+# Catches rows outside the monthly partitions, empty while those are created ahead
+event.listen(
+    BidEvent.__table__,
+    "after_create",
+    DDL("CREATE TABLE bid_events_default PARTITION OF bid_events DEFAULT"),
+)
+
+
 class WatchList(BaseModel):
     __tablename__ = "watchlists"
 
-    user_id: Mapped[GUUID] = Column(
-        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE")
-    )
+    user_id: Mapped[int] = Column(Integer, ForeignKey("users.pkid", ondelete="CASCADE"))
     user: Mapped[User] = relationship("User", lazy="joined")
 
-    listing_id: Mapped[GUUID] = Column(
-        UUID(as_uuid=True), ForeignKey("listings.id", ondelete="CASCADE")
+    listing_id: Mapped[int] = Column(
+        Integer, ForeignKey("listings.pkid", ondelete="CASCADE")
     )
     listing: Mapped[Listing] = relationship("Listing", lazy="joined")
 
-    session_key: Mapped[GUUID] = Column(
-        UUID(as_uuid=True), ForeignKey("guestusers.id", ondelete="CASCADE")
+    session_key: Mapped[int] = Column(
+        Integer, ForeignKey("guestusers.pkid", ondelete="CASCADE")
     )
 
     def __repr__(self):
@@ -137,4 +182,31 @@ class WatchList(BaseModel):
             "listing_id",
             name="unique_session_key_listing_watchlists",
         ),
+        Index("ix_watchlists_user_id_created_at", "user_id", "created_at"),
+        Index("ix_watchlists_session_key_created_at", "session_key", "created_at"),
     )
+
+
+# Closed listings are moved here with their bids and watchlists (see
+# ListingManager.archive_closed), old links to them still resolve
+class ListingArchive(Base):
+    __table__ = archive_table(Listing.__table__)
+
+    auctioneer: Mapped[User] = relationship("User", lazy="joined")
+    category: Mapped[Category] = relationship("Category", lazy="joined")
+    image: Mapped[File] = relationship("File", lazy="joined")
+
+    __repr__ = Listing.__repr__
+    time_left_seconds = Listing.time_left_seconds
+    time_left = Listing.time_left
+
+
+class BidArchive(Base):
+    __table__ = archive_table(Bid.__table__, archived=("listings",))
+
+    user: Mapped[User] = relationship("User", lazy="joined")
+
+
+Index("ix_bids_archive_listing_id", BidArchive.__table__.c.listing_id)
+
+watchlists_archive = archive_table(WatchList.__table__, archived=("listings",))
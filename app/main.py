@@ -1,9 +1,85 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI
+from sqlalchemy.engine import make_url
 from starlette.middleware.cors import CORSMiddleware
 
+from app.api.dependencies import get_current_superuser
 from app.api.routers import main_router
+from app.common.cache import CacheInvalidationListener, caches
 from app.common.exception_handlers import exc_handlers
+from app.common.responses import APIResponse
+from app.common.shared_cache import shared_cache
+from app.common.singleflight import single_flight
+from app.common.warmup import warm_up
 from app.core.config import settings
+from app.core.database import (
+    BACKGROUND,
+    CancelOnDisconnectMiddleware,
+    ReadYourWritesMiddleware,
+    SessionLocal,
+    engine,
+    engines,
+    pool_stats,
+    read_engines,
+    session_makers,
+)
+from app.db.managers.listings import bid_event_manager
+import asyncio, logging
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    listener = None
+    if (
+        settings.CACHE_INVALIDATION_LISTENER
+        and settings.DATABASE_POOLER_MODE
+        and not settings.SQLALCHEMY_DIRECT_DATABASE_URL
+    ):
+        # A transaction mode pooler hands LISTEN's session to others, nothing arrives
+        logger.warning(
+            "Cache invalidation listener disabled: pooler mode needs"
+            " SQLALCHEMY_DIRECT_DATABASE_URL, writes from other workers won't evict"
+            " this worker's caches"
+        )
+    elif settings.CACHE_INVALIDATION_LISTENER:
+        # LISTEN needs a session of its own, so it bypasses any pooler
+        url = make_url(settings.SQLALCHEMY_DIRECT_DATABASE_URL or engine.url)
+        listener = CacheInvalidationListener(
+            url.set(drivername="postgresql").render_as_string(hide_password=False)
+        )
+        listener.start()
+        try:
+            # Warm caches only once writes from other workers can evict them
+            await asyncio.wait_for(listener.listening.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            logger.warning("Cache invalidation listener is not connected yet")
+    try:
+        # The coming months' bid history partitions, before any bid lands in them
+        async with session_makers[BACKGROUND]() as db:
+            unpartitioned = await bid_event_manager.count_unpartitioned(db)
+            if unpartitioned:
+                logger.warning(
+                    f"{unpartitioned} bid events are in the default partition,"
+                    " see jobs/bid_event_partitions.py"
+                )
+            created = await bid_event_manager.create_partitions(
+                db, settings.BID_EVENTS_PARTITIONS_AHEAD
+            )
+        if created:
+            logger.info(f"Created bid history partitions: {', '.join(created)}")
+    except Exception as e:
+        logger.error(f"Creating bid history partitions failed: {e}")
+    if settings.WARMUP_ON_STARTUP:
+        try:
+            await warm_up(app, engine, SessionLocal)
+        except Exception as e:
+            # A cold worker is still a working worker
+            logger.error(f"Warm-up failed: {e}")
+    yield
+    if listener:
+        await listener.stop()
 
 
 app = FastAPI(
@@ -14,6 +90,8 @@ app = FastAPI(
     docs_url="/",
     security=[{"BearerToken": [], "GuestUserID": []}],
     exception_handlers=exc_handlers,
+    default_response_class=APIResponse,
+    lifespan=lifespan,
 )
 
 # Set all CORS enabled origins
@@ -35,9 +113,30 @@ app.add_middleware(
     ],
 )
 
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(CancelOnDisconnectMiddleware)
+
 app.include_router(main_router, prefix="/api/v6")
 
 
 @app.get("/api/v6/healthcheck", name="Healthcheck", tags=["Healthcheck"])
 async def healthcheck():
     return {"success": "pong!"}
+
+
+@app.get(
+    "/api/v6/metrics",
+    name="Metrics",
+    tags=["Healthcheck"],
+    dependencies=[Depends(get_current_superuser)],
+)
+async def metrics():
+    return {
+        "singleflight": single_flight.stats,
+        "caches": {name: cache.stats for name, cache in caches.items()},
+        "shared_cache": shared_cache.stats if shared_cache else None,
+        "database_pools": {
+            name: pool_stats(pool_engine) for name, pool_engine in engines.items()
+        },
+        "read_database_pools": [pool_stats(replica) for replica in read_engines],
+    }
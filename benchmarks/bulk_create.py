@@ -0,0 +1,57 @@
+"""
+Throughput of BaseManager.bulk_create at 10k, 100k and 1M rows, with INSERT ... VALUES
+chunks (below settings.DATABASE_BULK_COPY_THRESHOLD) against the binary COPY into a
+staging table (from it), on the files table. The inserted rows are deleted afterwards.
+
+Needs a migrated database (settings.SQLALCHEMY_DATABASE_URL).
+Run with: python benchmarks/bulk_create.py
+"""
+import asyncio, os, sys, time
+
+sys.path.append(os.path.abspath("./"))  # To single-handedly execute this script
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from app.core.config import settings
+from app.db.managers.base import file_manager
+from app.db.models.base import File
+
+SIZES = [10_000, 100_000, 1_000_000]
+
+
+async def measure(session_maker, rows: int, copy_threshold: int) -> float:
+    settings.DATABASE_BULK_COPY_THRESHOLD = copy_threshold
+    async with session_maker() as db:
+        last_pkid = (await db.execute(select(func.max(File.pkid)))).scalar() or 0
+        mappings = [{"resource_type": "image/png"} for _ in range(rows)]
+        start = time.perf_counter()
+        ids = await file_manager.bulk_create(db, mappings)
+        elapsed = time.perf_counter() - start
+        assert len(ids) == rows
+
+        await db.execute(delete(File).where(File.pkid > last_pkid))
+        await db.commit()
+    return rows / elapsed
+
+
+async def main() -> None:
+    engine = create_async_engine(settings.SQLALCHEMY_DATABASE_URL)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    results = {}
+    for rows in SIZES:
+        results[rows] = (
+            await measure(session_maker, rows, rows + 1),  # VALUES chunks
+            await measure(session_maker, rows, 0),  # COPY
+        )
+    await engine.dispose()
+
+    print(f"bulk_create into files ({settings.DATABASE_BULK_COPY_CHUNK_SIZE} per COPY)")
+    for rows, (values, copy) in results.items():
+        print(
+            f"  {rows} rows: values {values:.0f} rows/s vs copy {copy:.0f} rows/s"
+            f" ({copy / values:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
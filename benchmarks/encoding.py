@@ -0,0 +1,82 @@
+"""
+Encoding the listings feed with stdlib json (Starlette's JSONResponse) vs orjson
+(ORJSONResponse) vs MessagePack (APIResponse negotiated for
+'Accept: application/msgpack'),
+and decoding a create listing request body with json and orjson.
+
+Run with: python benchmarks/encoding.py
+"""
+import os, sys, timeit, json
+
+sys.path.append(os.path.abspath("./"))  # To single-handedly execute this script
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from app.api.schemas.listings import ListingsResponseSchema
+from app.api.utils.serializers import serialize_listing
+from app.common.responses import (
+    MSGPACK_MEDIA_TYPES,
+    APIResponse,
+    ORJSONResponse,
+    negotiated_media_type,
+)
+from benchmarks.fixtures import make_listing_rows, make_listings
+import orjson
+
+ROWS = 1000
+REPEAT = 5
+NUMBER = 20
+
+
+def best_ms(fn) -> float:
+    return min(timeit.repeat(fn, number=NUMBER, repeat=REPEAT)) / NUMBER * 1000
+
+
+def main() -> None:
+    listings = make_listings(ROWS)
+    fast_content = {
+        "status": "success",
+        "message": "Listings fetched",
+        "data": [serialize_listing(listing, False) for listing in listings],
+    }
+    schema_content = jsonable_encoder(
+        ListingsResponseSchema(
+            message="Listings fetched", data=make_listing_rows(listings)
+        )
+    )
+    body = json.dumps(
+        {
+            "name": "Product name",
+            "desc": "Product description",
+            "category": "technology",
+            "price": 1000.00,
+            "closing_date": "2030-01-01T00:00:00Z",
+            "file_type": "image/jpeg",
+        }
+    ).encode()
+
+    print(f"listings feed ({ROWS} rows)")
+    for name, content in (("fast path", fast_content), ("schema path", schema_content)):
+        stdlib = best_ms(lambda: JSONResponse(content))
+        fast = best_ms(lambda: ORJSONResponse(content))
+        token = negotiated_media_type.set(MSGPACK_MEDIA_TYPES[0])
+        packed = best_ms(lambda: APIResponse(content))
+        packed_size = len(APIResponse(content).body)
+        negotiated_media_type.reset(token)
+        print(
+            f"  {name}: json {stdlib:.2f}ms vs orjson {fast:.2f}ms"
+            f" vs msgpack {packed:.2f}ms"
+        )
+        print(
+            f"  {name} size: json {len(ORJSONResponse(content).body) / 1024:.1f}KB"
+            f" vs msgpack {packed_size / 1024:.1f}KB"
+        )
+
+    print("create listing body")
+    stdlib = best_ms(lambda: json.loads(body)) * 1000
+    fast = best_ms(lambda: orjson.loads(body)) * 1000
+    print(f"  json {stdlib:.2f}us vs orjson {fast:.2f}us")
+
+
+if __name__ == "__main__":
+    main()
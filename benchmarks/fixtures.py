@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+import uuid
+
+
+def make_user(idx: int):
+    avatar = SimpleNamespace(id=uuid.uuid4(), resource_type="image/png")
+    return SimpleNamespace(
+        id=uuid.uuid4(),
+        first_name="Test",
+        last_name=f"User{idx}",
+        full_name=f"Test User{idx}",
+        avatar_id=avatar.id,
+        avatar=avatar,
+    )
+
+
+def make_listings(count: int, auctioneers: int = 10):
+    users = [make_user(i) for i in range(auctioneers)]
+    category = SimpleNamespace(id=uuid.uuid4(), name="Technology", slug="technology")
+    listings = []
+    for idx in range(count):
+        image = SimpleNamespace(id=uuid.uuid4(), resource_type="image/jpeg")
+        listings.append(
+            SimpleNamespace(
+                id=uuid.uuid4(),
+                name=f"Listing {idx}",
+                auctioneer=users[idx % auctioneers],
+                slug=f"listing-{idx}",
+                desc="Korem ipsum dolor amet, consectetur adipiscing elit.",
+                category=category,
+                price=Decimal("1000.00"),
+                closing_date=datetime.utcnow() + timedelta(days=7),
+                time_left_seconds=7 * 24 * 3600 - idx,
+                active=True,
+                bids_count=idx % 5,
+                highest_bid=Decimal("1200.50"),
+                image=image,
+                image_id=image.id,
+            )
+        )
+    return listings
+
+
+def make_listing_rows(listings):
+    # Mirrors the dicts the listings routes used to build
+    # ({watchlist, time_left_seconds, **listing.dict()})
+    return [
+        {"watchlist": idx % 2 == 0, **vars(listing)}
+        for idx, listing in enumerate(listings)
+    ]
@@ -0,0 +1,160 @@
+"""
+Size and join cost of bids/watchlists referencing users, listings and guests by
+their UUID id against their integer pkid (the current schema), on scratch tables
+with the real tables' constraints and indexes.
+
+Needs a running database (settings.SQLALCHEMY_DATABASE_URL) on Postgres 13+.
+Run with: python benchmarks/integer_fks.py
+"""
+import asyncio, json, os, statistics, sys, time
+
+sys.path.append(os.path.abspath("./"))  # To single-handedly execute this script
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.core.config import settings
+
+SCHEMA = "bench_fks"
+USERS = 50_000
+LISTINGS = 20_000
+BIDS = 1_000_000
+WATCHLISTS = 500_000
+RUNS = 20
+
+SETUP = f"""
+CREATE TABLE {SCHEMA}.users (pkid serial PRIMARY KEY, id uuid UNIQUE);
+CREATE TABLE {SCHEMA}.listings (pkid serial PRIMARY KEY, id uuid UNIQUE);
+CREATE TABLE {SCHEMA}.guestusers (pkid serial PRIMARY KEY, id uuid UNIQUE);
+INSERT INTO {SCHEMA}.users (id)
+    SELECT gen_random_uuid() FROM generate_series(1, {USERS});
+INSERT INTO {SCHEMA}.listings (id)
+    SELECT gen_random_uuid() FROM generate_series(1, {LISTINGS});
+INSERT INTO {SCHEMA}.guestusers (id)
+    SELECT gen_random_uuid() FROM generate_series(1, {USERS});
+"""
+
+# {kind} is "uuid" or "int", {key} the referenced column and {type} its type
+TABLES = """
+CREATE TABLE {schema}.bids_{kind} (
+    pkid serial PRIMARY KEY, id uuid UNIQUE,
+    user_id {type} REFERENCES {schema}.users ({key}) ON DELETE CASCADE,
+    listing_id {type} REFERENCES {schema}.listings ({key}) ON DELETE CASCADE,
+    amount numeric(10, 2), created_at timestamp, updated_at timestamp,
+    UNIQUE (listing_id, amount), UNIQUE (user_id, listing_id)
+);
+CREATE INDEX ON {schema}.bids_{kind} (listing_id, updated_at);
+CREATE INDEX ON {schema}.bids_{kind} (user_id, updated_at);
+CREATE TABLE {schema}.watchlists_{kind} (
+    pkid serial PRIMARY KEY, id uuid UNIQUE,
+    user_id {type} REFERENCES {schema}.users ({key}) ON DELETE CASCADE,
+    listing_id {type} REFERENCES {schema}.listings ({key}) ON DELETE CASCADE,
+    session_key {type} REFERENCES {schema}.guestusers ({key}) ON DELETE CASCADE,
+    created_at timestamp, updated_at timestamp,
+    UNIQUE (user_id, listing_id), UNIQUE (session_key, listing_id)
+);
+CREATE INDEX ON {schema}.watchlists_{kind} (user_id, created_at);
+CREATE INDEX ON {schema}.watchlists_{kind} (session_key, created_at);
+INSERT INTO {schema}.bids_{kind}
+    (id, user_id, listing_id, amount, created_at, updated_at)
+    SELECT gen_random_uuid(), u.{key}, l.{key}, n, now(), now()
+    FROM generate_series(1, {bids}) n
+    JOIN {schema}.users u ON u.pkid = 1 + n % {users}
+    JOIN {schema}.listings l ON l.pkid = 1 + (n / {users}) % {listings};
+INSERT INTO {schema}.watchlists_{kind} (id, user_id, listing_id, created_at, updated_at)
+    SELECT gen_random_uuid(), u.{key}, l.{key}, now(), now()
+    FROM generate_series(1, {watchlists}) n
+    JOIN {schema}.users u ON u.pkid = 1 + n % {users}
+    JOIN {schema}.listings l ON l.pkid = 1 + (n / {users}) % {listings};
+ANALYZE {schema}.bids_{kind};
+ANALYZE {schema}.watchlists_{kind};
+"""
+
+# Bids per listing with their users (the bid feeds) and every watchlisted listing
+JOINS = {
+    "bids_join": """
+        SELECT l.pkid, count(*), max(b.amount) FROM {schema}.bids_{kind} b
+        JOIN {schema}.listings l ON l.{key} = b.listing_id
+        JOIN {schema}.users u ON u.{key} = b.user_id
+        GROUP BY l.pkid
+    """,
+    "watchlists_join": """
+        SELECT count(*) FROM {schema}.watchlists_{kind} w
+        JOIN {schema}.listings l ON l.{key} = w.listing_id
+        JOIN {schema}.users u ON u.{key} = w.user_id
+    """,
+}
+
+
+def peak_memory(plan: dict) -> int:
+    # kB held by the hash tables and sorts of a plan
+    memory = plan.get("Peak Memory Usage", 0) + plan.get("Sort Space Used", 0)
+    return memory + sum(peak_memory(child) for child in plan.get("Plans", []))
+
+
+async def measure(conn, kind: str, key: str, column_type: str) -> dict:
+    params = {
+        "schema": SCHEMA,
+        "kind": kind,
+        "key": key,
+        "type": column_type,
+        "users": USERS,
+        "listings": LISTINGS,
+        "bids": BIDS,
+        "watchlists": WATCHLISTS,
+    }
+    for statement in TABLES.format(**params).split(";"):
+        if statement.strip():
+            await conn.execute(text(statement))
+
+    result = {}
+    for table in ("bids", "watchlists"):
+        name = f"'{SCHEMA}.{table}_{kind}'"
+        result[f"{table}_table_mb"], result[f"{table}_indexes_mb"] = (
+            await conn.execute(
+                text(
+                    f"SELECT pg_table_size({name}) / 1048576.0,"
+                    f" pg_indexes_size({name}) / 1048576.0"
+                )
+            )
+        ).one()
+
+    for join, query in JOINS.items():
+        query = query.format(**params)
+        timings = []
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            await conn.execute(text(query))
+            timings.append((time.perf_counter() - start) * 1000)
+        result[f"{join}_p50_ms"] = statistics.median(timings)
+        plan = (
+            await conn.execute(text(f"EXPLAIN (ANALYZE, FORMAT JSON) {query}"))
+        ).scalar()
+        plan = plan if isinstance(plan, list) else json.loads(plan)
+        result[f"{join}_memory_kb"] = peak_memory(plan[0]["Plan"])
+    return result
+
+
+async def main() -> None:
+    engine = create_async_engine(settings.SQLALCHEMY_DATABASE_URL)
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        for statement in SETUP.split(";"):
+            if statement.strip():
+                await conn.execute(text(statement))
+        results = {
+            "uuid fks": await measure(conn, "uuid", "id", "uuid"),
+            "integer fks": await measure(conn, "int", "pkid", "integer"),
+        }
+        await conn.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+    await engine.dispose()
+
+    print(f"{BIDS} bids and {WATCHLISTS} watchlists, joins p50 over {RUNS} runs")
+    for name, result in results.items():
+        print(f"  {name}:")
+        for metric, value in result.items():
+            print(f"    {metric}: {value:.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
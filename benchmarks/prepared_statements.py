@@ -0,0 +1,78 @@
+"""
+Latency of the hot manager queries with and without server-side prepared statements:
+listing_manager.get_by_slug, user_manager.get_by_email, jwt_manager.get_by_user_id
+and bid_manager.get_by_listing_id.
+
+Needs a migrated database (settings.SQLALCHEMY_DATABASE_URL), seeded data makes the
+lookups hit rows.
+Run with: python benchmarks/prepared_statements.py
+"""
+import asyncio, os, statistics, sys, time, uuid
+
+sys.path.append(os.path.abspath("./"))  # To single-handedly execute this script
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from app.core.config import settings
+from app.db.managers.accounts import jwt_manager, user_manager
+from app.db.managers.listings import bid_manager, listing_manager
+
+RUNS = 2000
+WARMUP_RUNS = 10
+
+
+async def pick_args(db) -> dict:
+    # Real rows when the database is seeded, misses (still index lookups) otherwise
+    listings = await listing_manager.get_all(db)
+    users = await user_manager.get_all(db)
+    listing = listings[0] if listings else None
+    user = users[0] if users else None
+    return {
+        "get_by_slug": (listing_manager, listing.slug if listing else "missing"),
+        "get_by_email": (user_manager, user.email if user else "missing@example.com"),
+        "get_by_user_id": (jwt_manager, user.id if user else uuid.uuid4()),
+        "get_by_listing_id": (bid_manager, listing.id if listing else uuid.uuid4()),
+    }
+
+
+async def measure(prepare_threshold) -> dict:
+    # One connection, prepared statements live per connection
+    engine = create_async_engine(
+        settings.SQLALCHEMY_DATABASE_URL,
+        pool_size=1,
+        max_overflow=0,
+        connect_args={"prepare_threshold": prepare_threshold},
+    )
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    results = {}
+    async with session_maker() as db:
+        for method, (manager, arg) in (await pick_args(db)).items():
+            query = getattr(manager, method)
+            for _ in range(WARMUP_RUNS):
+                await query(db, arg)
+            timings = []
+            for _ in range(RUNS):
+                start = time.perf_counter()
+                await query(db, arg)
+                timings.append((time.perf_counter() - start) * 1000)
+                # Don't let the identity map grow across runs
+                db.expunge_all()
+            percentiles = statistics.quantiles(timings, n=100)
+            results[method] = (percentiles[49], percentiles[98])
+    await engine.dispose()
+    return results
+
+
+async def main() -> None:
+    unprepared = await measure(None)
+    prepared = await measure(0)
+    print(f"hot manager queries ({RUNS} runs each, p50 / p99)")
+    for method, (p50, p99) in unprepared.items():
+        prepared_p50, prepared_p99 = prepared[method]
+        print(
+            f"  {method}: unprepared {p50:.3f}ms / {p99:.3f}ms"
+            f" vs prepared {prepared_p50:.3f}ms / {prepared_p99:.3f}ms"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
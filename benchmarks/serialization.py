@@ -0,0 +1,67 @@
+"""
+Cost of serializing the listings feed:
+* the ListingsResponseSchema path with and without memoized file urls
+* the fast path serializers (app/api/utils/serializers.py)
+
+Run with: python benchmarks/serialization.py
+"""
+import os, sys, timeit, json
+
+sys.path.append(os.path.abspath("./"))  # To single-handedly execute this script
+
+from fastapi.encoders import jsonable_encoder
+from app.api.schemas.listings import ListingsResponseSchema
+from app.api.utils.file_processors import FileProcessor
+from app.api.utils.serializers import serialize_listing
+from benchmarks.fixtures import make_listing_rows, make_listings
+
+ROWS = 1000
+REPEAT = 5
+
+
+def schema_path(listings):
+    # What FastAPI does with a returned dict: validate against the response model,
+    # encode, dump
+    rows = make_listing_rows(listings)
+    content = ListingsResponseSchema(message="Listings fetched", data=rows)
+    json.dumps(jsonable_encoder(content))
+
+
+def fast_path(listings):
+    data = [
+        serialize_listing(listing, idx % 2 == 0) for idx, listing in enumerate(listings)
+    ]
+    json.dumps({"status": "success", "message": "Listings fetched", "data": data})
+
+
+def per_row_us(fn, listings) -> float:
+    best = min(timeit.repeat(lambda: fn(listings), number=1, repeat=REPEAT))
+    return best / len(listings) * 1_000_000
+
+
+def main() -> None:
+    listings = make_listings(ROWS)
+    cached = FileProcessor.generate_file_url
+
+    FileProcessor.generate_file_url = staticmethod(cached.__wrapped__)
+    uncached_cost = per_row_us(schema_path, listings)
+
+    FileProcessor.generate_file_url = cached
+    cached.cache_clear()
+    cached_cost = per_row_us(schema_path, listings)
+    fast_cost = per_row_us(fast_path, listings)
+
+    print(f"rows: {ROWS}")
+    print(f"schema path, uncached file urls: {uncached_cost:.1f}us/row")
+    print(f"schema path, memoized file urls: {cached_cost:.1f}us/row")
+    print(f"fast path: {fast_cost:.1f}us/row")
+    print(
+        f"per {ROWS} rows: schema {cached_cost * ROWS / 1000:.1f}ms"
+        f" vs fast {fast_cost * ROWS / 1000:.1f}ms"
+        f" ({1_000_000 / cached_cost:.0f} vs {1_000_000 / fast_cost:.0f} rows/s)"
+    )
+    print(f"cache: {cached.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Insert throughput and unique index shape with random (uuid4) and time-ordered
+(uuid7, BaseModel's default) ids, on scratch tables shaped like the insert heavy
+bids/watchlists/listings ones (serial pkid, unique id).
+
+Postgres doesn't count page splits, the leaf pages against the ones the index
+would need when only appended to (and the leaf density, when pgstattuple is
+available) show them instead.
+
+Needs a running database (settings.SQLALCHEMY_DATABASE_URL).
+Run with: python benchmarks/uuid_ids.py
+"""
+import asyncio, os, sys, time, uuid
+
+sys.path.append(os.path.abspath("./"))  # To single-handedly execute this script
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.core.config import settings
+from app.db.models.base import uuid7
+
+ROWS = 200_000
+BATCH = 1000  # rows per transaction
+PAGE_SIZE = 8192
+INDEX_ENTRY_SIZE = 28  # 16 byte uuid, 8 byte tuple header and 4 byte line pointer
+LEAF_FILLFACTOR = 0.9  # Postgres' default for btree leaves
+
+
+async def measure(conn, name: str, make_id) -> dict:
+    table = f"bench_{name}_ids"
+    await conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
+    await conn.execute(
+        text(f"CREATE TABLE {table} (pkid serial PRIMARY KEY, id uuid UNIQUE)")
+    )
+    await conn.commit()
+
+    start = time.perf_counter()
+    for _ in range(ROWS // BATCH):
+        await conn.execute(
+            text(f"INSERT INTO {table} (id) VALUES (:id)"),
+            [{"id": make_id()} for _ in range(BATCH)],
+        )
+        await conn.commit()
+    elapsed = time.perf_counter() - start
+
+    index = f"{table}_id_key"
+    result = {
+        "rows_per_second": ROWS / elapsed,
+        "index_bytes": (
+            await conn.execute(text(f"SELECT pg_relation_size('{index}')"))
+        ).scalar(),
+        "ideal_pages": int(ROWS * INDEX_ENTRY_SIZE / (PAGE_SIZE * LEAF_FILLFACTOR)) + 1,
+    }
+    try:
+        stats = (
+            await conn.execute(
+                text(
+                    "SELECT leaf_pages, avg_leaf_density, leaf_fragmentation"
+                    f" FROM pgstatindex('{index}')"
+                )
+            )
+        ).one()
+        result.update(stats._asdict())
+    except Exception:  # pgstattuple isn't installed
+        await conn.rollback()
+        result["leaf_pages"] = result["index_bytes"] // PAGE_SIZE
+
+    await conn.execute(text(f"DROP TABLE {table}"))
+    await conn.commit()
+    return result
+
+
+async def main() -> None:
+    engine = create_async_engine(settings.SQLALCHEMY_DATABASE_URL)
+    async with engine.connect() as conn:
+        try:
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pgstattuple"))
+            await conn.commit()
+        except Exception:  # Not available, or not allowed for this role
+            await conn.rollback()
+    async with engine.connect() as conn:
+        results = {
+            "uuid4": await measure(conn, "uuid4", uuid.uuid4),
+            "uuid7": await measure(conn, "uuid7", uuid7),
+        }
+    await engine.dispose()
+
+    print(f"unique id index after {ROWS} inserts ({BATCH} per transaction)")
+    for name, result in results.items():
+        line = (
+            f"  {name}: {result['rows_per_second']:.0f} rows/s,"
+            f" index {result['index_bytes'] / 1024 / 1024:.1f}MB,"
+            f" {result['leaf_pages']} leaf pages ({result['ideal_pages']} ideal)"
+        )
+        if "avg_leaf_density" in result:
+            line += (
+                f", leaf density {result['avg_leaf_density']:.0f}%,"
+                f" fragmentation {result['leaf_fragmentation']:.0f}%"
+            )
+        print(line)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -5,17 +5,14 @@ sys.path.append(os.path.abspath("./"))  # To single-handedly execute this script
 import logging
 
 from initials.data_script import CreateData
-from app.core.database import engine
-from sqlalchemy.ext.asyncio import async_sessionmaker
+from app.core.database import BULK, get_session
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
-
 
 async def init() -> None:
-    db = SessionLocal()
+    db = get_session(BULK)
     create_data = CreateData(db)
     await create_data.initialize()
     await db.close()
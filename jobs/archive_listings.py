@@ -0,0 +1,33 @@
+import asyncio, os, sys
+
+sys.path.append(os.path.abspath("./"))  # To single-handedly execute this script
+
+import logging
+from datetime import datetime, timedelta
+
+from app.core.config import settings
+from app.core.database import BACKGROUND, get_session
+from app.db.managers.listings import listing_manager
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def archive() -> int:
+    closed_before = datetime.utcnow() - timedelta(
+        days=settings.ARCHIVE_LISTINGS_AFTER_DAYS
+    )
+    async with get_session(BACKGROUND) as db:
+        return await listing_manager.archive_closed(
+            db, closed_before, settings.ARCHIVE_BATCH_SIZE
+        )
+
+
+async def main() -> None:
+    logger.info("Archiving closed listings")
+    moved = await archive()
+    logger.info(f"Archived {moved} listings with their bids and watchlists")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,47 @@
+import asyncio, os, sys
+
+sys.path.append(os.path.abspath("./"))  # To single-handedly execute this script
+
+import logging
+from datetime import datetime
+
+from app.core.config import settings
+from app.core.database import BACKGROUND, get_session
+from app.db.managers.listings import bid_event_manager, month_start
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def maintain() -> None:
+    async with get_session(BACKGROUND) as db:
+        unpartitioned = await bid_event_manager.count_unpartitioned(db)
+        if unpartitioned:
+            # Creating their months' partitions fails until the rows are moved out
+            logger.warning(
+                f"{unpartitioned} bid events are in the default partition,"
+                " move them to their month's partition table and rerun this job"
+            )
+
+        created = await bid_event_manager.create_partitions(
+            db, settings.BID_EVENTS_PARTITIONS_AHEAD
+        )
+        logger.info(f"Created bid history partitions: {', '.join(created) or 'none'}")
+
+        if settings.BID_EVENTS_KEEP_MONTHS is not None:
+            before = month_start(
+                datetime.utcnow().date(), -settings.BID_EVENTS_KEEP_MONTHS
+            )
+            detached = await bid_event_manager.detach_partitions(db, before)
+            logger.info(
+                f"Detached bid history partitions: {', '.join(detached) or 'none'}"
+            )
+
+
+async def main() -> None:
+    logger.info("Maintaining bid history partitions")
+    await maintain()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())